@@ -1,15 +1,20 @@
 # database.py - PostgreSQL Database Setup
 
 from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError, ProgrammingError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import hashlib
+import logging
 from dotenv import load_dotenv
 
 # Load .env file from backend directory
 env_path = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(dotenv_path=env_path)
 
+logger = logging.getLogger(__name__)
+
 # Database URL from environment variable
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
@@ -25,11 +30,47 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base class for models
 Base = declarative_base()
 
+# create_tables() leaves a .schema_<hash> marker here once the current schema exists
+# (git-ignored; it is per machine and database)
+SCHEMA_MARKER_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+def _schema_marker() -> str:
+    schema = repr(sorted(
+        (table.name, tuple(column.name for column in table.columns))
+        for table in Base.metadata.tables.values()
+    )) + "|" + engine.url.render_as_string(hide_password=True)
+    return os.path.join(SCHEMA_MARKER_DIR, f".schema_{hashlib.blake2b(schema.encode(), digest_size=8).hexdigest()}")
+
+def create_tables(force: bool = False):
+    """
+    Create any missing tables, skipping the per-table catalog checks when this schema
+    (table and column names) was already created on this database. The marker only
+    records that; if the database is dropped later, get_db notices the missing table
+    and calls this again with force=True.
+    """
+    marker = _schema_marker()
+    if os.path.exists(marker) and not force:
+        logger.info("Schema marker %s exists; skipping table creation", os.path.basename(marker))
+        return
+    Base.metadata.create_all(bind=engine)
+    os.makedirs(SCHEMA_MARKER_DIR, exist_ok=True)
+    open(marker, "w").close()
+
+def _is_missing_table(error) -> bool:
+    """PostgreSQL undefined_table (42P01) or SQLite's "no such table" error"""
+    return getattr(error.orig, "pgcode", None) == "42P01" or "no such table" in str(error.orig)
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
     try:
         yield db
+    except (ProgrammingError, OperationalError) as e:
+        if _is_missing_table(e):
+            # The schema marker outlived the tables (database dropped/recreated)
+            logger.error("Table missing despite the schema marker; recreating tables: %s", e.orig)
+            create_tables(force=True)
+        raise
     finally:
         db.close()
 
@@ -1,19 +1,19 @@
 # main.py - FastAPI Backend with PostgreSQL
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from services import report_reader
-import os, io, json
+import os, io, json, logging
 from PIL import Image
 from typing import Optional
 from pydantic import BaseModel
 from models.schemas import ChatRequest, ChatAnswer, ImageAnalysis
 from models.database_models import Pet
-from database import get_db, Base, engine
+from database import get_db, SessionLocal, create_tables
 from services.db_service import (
     get_pet_profile, create_or_update_pet_profile, create_chat_message,
     get_chat_messages, create_uploaded_image, create_report, get_pet_reports
@@ -24,16 +24,21 @@ from services.auth_service import (
 from services.dog_detector import is_dog_image
 from services.breed_classifier import predict_breed
 from services.image_service import analyze_image
-from services.storage import ensure_dirs, UPLOAD_DIR, REPORT_DIR, register_image
+from services.storage import ensure_dirs, UPLOAD_DIR, REPORT_DIR, register_image, upload_path
 from services.llm_service import (
     generate_dynamic_answer,
+    generate_dynamic_answer_stream,
     generate_dynamic_answer_with_faq_context,
-    write_ai_message_to_database
+    generate_dynamic_answer_with_faq_context_stream,
+    write_ai_message_to_database,
+    start_db_writer,
+    stop_db_writer,
+    close_openai_client
 )
 from services.nutrition_service import calculate_and_suggest_nutrition, NutritionResult
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Create tables (once per schema version)
+create_tables()
 
 app = FastAPI(title="Dog Health AI Backend", version="2.0.0")
 security = HTTPBearer()
@@ -60,6 +65,27 @@ ensure_dirs()
 app.mount("/reports", StaticFiles(directory=REPORT_DIR), name="reports")
 app.mount("/images", StaticFiles(directory=UPLOAD_DIR), name="images")
 
+# Service loggers write through the root handler; LOG_LEVEL=DEBUG shows per-request detail
+@app.on_event("startup")
+async def configure_logging():
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+
+# Background chat-message writer
+@app.on_event("startup")
+async def startup_db_writer():
+    start_db_writer()
+
+@app.on_event("shutdown")
+async def shutdown_db_writer():
+    await stop_db_writer()
+
+@app.on_event("shutdown")
+async def shutdown_openai_client():
+    await close_openai_client()
+
 # Pydantic Models
 class PetProfileData(BaseModel):
     petName: str
@@ -299,7 +325,7 @@ async def chat_in_session(
     
     elif intent == "IMAGE_QUERY":
         # Image analysis flow - use existing logic (unchanged)
-        answer = generate_dynamic_answer(
+        answer = await generate_dynamic_answer(
             user_msg, history, location, pet_profile, image_analysis_context
         )
         source = "gpt"
@@ -333,7 +359,7 @@ async def chat_in_session(
                 # Weak FAQ match - enhance with GPT using FAQ context
                 try:
                     faq_context = get_faq_context_for_gpt_optimized(db, user_msg, top_k=2)
-                    answer = generate_dynamic_answer_with_faq_context(
+                    answer = await generate_dynamic_answer_with_faq_context(
                         user_msg, history, location, pet_profile, faq_context
                     )
                 except Exception as e:
@@ -349,13 +375,13 @@ async def chat_in_session(
                 # No FAQ match - use GPT with FAQ context as background
                 try:
                     faq_context = get_faq_context_for_gpt_optimized(db, user_msg, top_k=3)
-                    answer = generate_dynamic_answer_with_faq_context(
+                    answer = await generate_dynamic_answer_with_faq_context(
                         user_msg, history, location, pet_profile, faq_context
                     )
                 except Exception as e:
                     print(f"Error in FAQ context generation: {e}")
                     # Fallback to regular GPT answer
-                    answer = generate_dynamic_answer(
+                    answer = await generate_dynamic_answer(
                         user_msg, history, location, pet_profile, None
                     )
                 source = "gpt"
@@ -368,7 +394,7 @@ async def chat_in_session(
             print(f"Error in FAQ service, using GPT fallback: {e}")
             import traceback
             traceback.print_exc()
-            answer = generate_dynamic_answer(
+            answer = await generate_dynamic_answer(
                 user_msg, history, location, pet_profile, None
             )
             source = "gpt"
@@ -387,6 +413,86 @@ async def chat_in_session(
         confidence=confidence
     )
 
+@app.post("/user/{user_id}/pet/{pet_id}/chat/stream")
+async def chat_in_session_stream(
+    user_id: int,
+    pet_id: str,
+    req: ChatRequest,
+    current_user_id: int = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Streams the answer as plain text so the client can render tokens as they arrive"""
+    if current_user_id != user_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    from services.db_service import get_pet_by_id, get_pet_profile
+    pet = get_pet_by_id(db, user_id, pet_id)
+    if not pet:
+        raise HTTPException(status_code=404, detail="Pet not found. Please complete your pet profile first.")
+    
+    user_msg = req.question.strip()
+    location = getattr(req, "location", None)
+    pet_profile_db = get_pet_profile(db, user_id, pet_id)
+    if req.pet_profile and pet_profile_db:
+        pet_profile = {**pet_profile_db, **req.pet_profile}  # Request data overrides DB data
+    else:
+        pet_profile = req.pet_profile or pet_profile_db or {}
+    image_url = getattr(req, "image_url", None)
+    image_analysis_context = getattr(req, "image_analysis_context", None)
+    
+    create_chat_message(db, pet.id, str(user_id), user_msg, image_url=image_url)
+    
+    from services.intent_router import detect_intent, get_greeting_response
+    has_image = image_url is not None or image_analysis_context is not None
+    intent = detect_intent(user_msg, has_image=has_image)
+    pet_db_id = pet.id
+    
+    def pick_stream():
+        if intent == "GREETING":
+            return None, get_greeting_response(pet_profile.get('petName'))
+        if intent == "IMAGE_QUERY":
+            return generate_dynamic_answer_stream(
+                user_msg, [], location, pet_profile, image_analysis_context
+            ), None
+        # Same FAQ routing as the JSON chat endpoint
+        try:
+            from services.faq_service_optimized import (
+                get_faq_answer_optimized,
+                get_faq_context_for_gpt_optimized
+            )
+            faq_answer, best_faq, conf_level, similarity = get_faq_answer_optimized(
+                db, user_msg, top_k=3
+            )
+            if faq_answer and conf_level in ("high", "medium"):
+                return None, faq_answer
+            faq_context = get_faq_context_for_gpt_optimized(
+                db, user_msg, top_k=2 if faq_answer else 3
+            )
+            return generate_dynamic_answer_with_faq_context_stream(
+                user_msg, [], location, pet_profile, faq_context
+            ), None
+        except Exception as e:
+            print(f"Error in FAQ service, using GPT fallback: {e}")
+            return generate_dynamic_answer_stream(
+                user_msg, [], location, pet_profile, None
+            ), None
+    
+    stream, direct_answer = pick_stream()
+    
+    async def answer_chunks():
+        if stream is None:
+            parts = [direct_answer]
+            yield direct_answer
+        else:
+            parts = []
+            async for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+        # Save the complete AI response once streaming finishes
+        await write_ai_message_to_database(db, pet_db_id, "".join(parts), sender_is_user=False)
+    
+    return StreamingResponse(answer_chunks(), media_type="text/plain; charset=utf-8")
+
 @app.get("/user/{user_id}/pet/{pet_id}/chat/messages")
 async def get_chat_messages_endpoint(
     user_id: int,
@@ -545,7 +651,7 @@ async def combined_upload_and_analyze(
         os.makedirs(UPLOAD_DIR, exist_ok=True)
         
         # Save file
-        dst = os.path.join(UPLOAD_DIR, unique_filename)
+        dst = upload_path(unique_filename)
         with open(dst, "wb") as f:
             f.write(raw)
         
@@ -584,7 +690,7 @@ async def combined_upload_and_analyze(
             # Save user message and error response to chat
             image_url = f"/images/{unique_filename}"
             user_msg_obj = create_chat_message(db, pet.id, str(user_id), f"📷 Uploaded photo: {file.filename or 'image'}", image_url=image_url)
-            ai_msg_obj = await write_ai_message_to_database(db, pet.id, error_msg, sender_is_user=False)
+            ai_msg_obj = await write_ai_message_to_database(db, pet.id, error_msg, sender_is_user=False, flush=True)
             
             # Prepare messages for response
             messages_list = []
@@ -636,7 +742,7 @@ async def combined_upload_and_analyze(
                 
                 image_url = f"/images/{unique_filename}"
                 user_msg_obj = create_chat_message(db, pet.id, str(user_id), f"📷 Uploaded photo: {file.filename or 'image'}", image_url=image_url)
-                ai_msg_obj = await write_ai_message_to_database(db, pet.id, error_msg, sender_is_user=False)
+                ai_msg_obj = await write_ai_message_to_database(db, pet.id, error_msg, sender_is_user=False, flush=True)
                 
                 # Prepare messages for response
                 messages_list = []
@@ -678,7 +784,7 @@ async def combined_upload_and_analyze(
                 
                 image_url = f"/images/{unique_filename}"
                 user_msg_obj = create_chat_message(db, pet.id, str(user_id), f"📷 Uploaded photo: {file.filename or 'image'}", image_url=image_url)
-                ai_msg_obj = await write_ai_message_to_database(db, pet.id, error_msg, sender_is_user=False)
+                ai_msg_obj = await write_ai_message_to_database(db, pet.id, error_msg, sender_is_user=False, flush=True)
                 
                 # Prepare messages for response
                 messages_list = []
@@ -823,7 +929,7 @@ async def combined_upload_and_analyze(
             })
             
             # Send comprehensive health analysis message as AI response
-            ai_msg_result = await write_ai_message_to_database(db, pet.id, full_summary, sender_is_user=False)
+            ai_msg_result = await write_ai_message_to_database(db, pet.id, full_summary, sender_is_user=False, flush=True)
             print(f"AI analysis message saved: {len(full_summary)} characters, Result: {ai_msg_result}")
             
             # Verify messages were saved by querying them back
@@ -895,7 +1001,7 @@ async def analyze_vet_report(
     file_type = file.content_type.lower()
     
     if 'pdf' in file_type or 'image' in file_type:
-        report_results = report_reader.analyze_health_report(raw, file_type)
+        report_results = await report_reader.analyze_health_report(raw, file_type)
         
         if "error" in report_results:
             raise HTTPException(status_code=400, detail=report_results["detail"])
@@ -911,6 +1017,57 @@ async def analyze_vet_report(
     else:
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
+@app.post("/user/{user_id}/pet/{pet_id}/upload/analyze_document/stream")
+async def analyze_vet_report_stream(
+    user_id: int,
+    pet_id: str,
+    file: UploadFile = File(...),
+    current_user_id: int = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Same as analyze_document, but streams the analysis as plain text as it is generated.
+    Text extraction/OCR runs before the response starts (so failures are still a 400);
+    clients should show an "analyzing your report..." state until the first chunk.
+    """
+    if current_user_id != user_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    from services.db_service import get_pet_by_id
+    pet = get_pet_by_id(db, user_id, pet_id)
+    if not pet:
+        raise HTTPException(status_code=404, detail="Pet not found")
+    
+    file_type = file.content_type.lower()
+    if 'pdf' not in file_type and 'image' not in file_type:
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    
+    dst = os.path.join(REPORT_DIR, file.filename)
+    raw = await file.read()
+    with open(dst, "wb") as f:
+        f.write(raw)
+    
+    extracted = await report_reader.extract_report_text(raw, file_type)
+    if "error" in extracted:
+        raise HTTPException(status_code=400, detail=extracted["detail"])
+    
+    create_chat_message(db, pet.id, str(user_id), f"Vet Report uploaded: {file.filename}.")
+    pet_db_id = pet.id
+    filename = file.filename
+    
+    async def analysis_chunks():
+        parts = []
+        async for chunk in report_reader.analyze_report_text_stream(extracted["report_text"]):
+            parts.append(chunk)
+            yield chunk
+        # Save the report and the AI message once the analysis is complete
+        analysis = "".join(parts)
+        with SessionLocal() as report_db:
+            create_report(report_db, user_id, pet_db_id, filename, dst, analysis)
+        await write_ai_message_to_database(db, pet_db_id, analysis, sender_is_user=False)
+    
+    return StreamingResponse(analysis_chunks(), media_type="text/plain; charset=utf-8")
+
 # Nutrition endpoint
 @app.post("/user/{user_id}/pet/{pet_id}/nutrition/calculate", response_model=NutritionResult)
 async def get_nutrition_recommendations(
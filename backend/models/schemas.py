@@ -2,7 +2,7 @@ from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 
 class ChatRequest(BaseModel):
-    question: str = Field(..., min_length=2)
+    question: str = Field(..., min_length=2, max_length=2000)
     pet_profile: Optional[Dict[str, Any]] = None
     image_url: Optional[str] = None  # URL to previously uploaded image for context
     image_analysis_context: Optional[Dict[str, Any]] = None  # Pre-analyzed image data
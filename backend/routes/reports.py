@@ -8,7 +8,7 @@ router = APIRouter(prefix="/reports", tags=["Reports"])
 
 
 def reports_list(): 
-    """Return the registry (data/reports.json).""" 
+    """Return the registry (data/reports.jsonl).""" 
     return storage_list_reports() 
 
 @router.get("/download/{report_id}/") 
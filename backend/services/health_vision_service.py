@@ -1,20 +1,67 @@
 # health_vision_service.py - Advanced Health Analysis from Dog Images
 
 import os
+import re
+import copy
 import base64
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, List, Tuple
-from PIL import Image
 import cv2
 import numpy as np
+import httpx
 from openai import OpenAI
 from dotenv import load_dotenv
+from services.image_service import read_image_bgr
+from services.response_messages import (
+    get_breed_detection_message, LOW_CONFIDENCE_WARNING, _count_recent_message_type
+)
 
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 client = None
 if OPENAI_API_KEY and OPENAI_API_KEY != "your-openai-api-key-here":
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    # Explicit pooled HTTP client so TCP+TLS connections are kept alive
+    # and reused across consecutive image uploads
+    client = OpenAI(
+        api_key=OPENAI_API_KEY,
+        http_client=httpx.Client(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=40),
+        ),
+    )
+
+# Keyword categories used to structure the free-text vision analysis.
+# Each pattern is matched case-insensitively against the raw response.
+_BODY_UNDER = re.compile(r"\b(underweight|thin|ribs visible|emaciated)\b", re.I)
+_BODY_OVER = re.compile(r"\b(overweight|obese|excess weight|chubby)\b", re.I)
+_COAT_HEALTHY = re.compile(r"\b(healthy coat|shiny|glossy|well-groomed)\b", re.I)
+_COAT_DRY = re.compile(r"\b(dry|dull|matte|dull coat)\b", re.I)
+_COAT_MATTED = re.compile(r"\b(matted|tangled|unkempt)\b", re.I)
+_COAT_SKIN = re.compile(r"\b(skin|rash|irritation|redness|sores)\b", re.I)
+_EYES_CLEAR = re.compile(r"\b(clear eyes|bright|alert)\b", re.I)
+_EYES_ISSUE = re.compile(r"\b(discharge|tearing|redness|cloudy)\b", re.I)
+_ENERGY_HIGH = re.compile(r"\b(alert|energetic|active|playful)\b", re.I)
+_ENERGY_LOW = re.compile(r"\b(lethargic|tired|low energy|sluggish)\b", re.I)
+
+# ImageNet class ID prefix (format: n######## breed_name)
+_CLEAN_BREED_RE = re.compile(r"^n\d+ (.+)$", re.S)
+
+# Vision API results keyed by (image content hash, breed) so re-analyzing the
+# same photo (e.g. chat follow-ups on an uploaded image) skips the API call
+_VISION_CACHE_SIZE = 128
+_vision_cache: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+
+def _file_key(image_path: str) -> str:
+    """Content hash of an image file, streamed in 64 KB chunks (constant memory)"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            h.update(chunk)
+    return h.hexdigest()
 
 def encode_image(image_path: str) -> str:
     """Encode image to base64 for OpenAI Vision API"""
@@ -40,6 +87,12 @@ def analyze_health_with_vision(image_path: str, breed: str = None) -> Dict[str,
     # Try OpenAI Vision API first if available
     if client:
         try:
+            cache_key = (_file_key(image_path), breed)
+            cached = _vision_cache.get(cache_key)
+            if cached is not None:
+                _vision_cache.move_to_end(cache_key)
+                return copy.deepcopy(cached)
+            
             base64_image = encode_image(image_path)
             
             prompt = f"""Analyze this dog image for health indicators. Focus on:
@@ -86,41 +139,38 @@ Provide a detailed health assessment in a structured format. Be specific about w
             health_analysis["vision_analysis"] = vision_analysis
             health_analysis["observations"].append(vision_analysis)
             
-            # Extract structured information from the analysis
-            analysis_lower = vision_analysis.lower()
-            
             # Body condition assessment
-            if any(word in analysis_lower for word in ["underweight", "thin", "ribs visible", "emaciated"]):
+            if _BODY_UNDER.search(vision_analysis):
                 health_analysis["body_condition"] = "Underweight"
                 health_analysis["concerns"].append("Dog appears underweight - consider nutritional assessment")
-            elif any(word in analysis_lower for word in ["overweight", "obese", "excess weight", "chubby"]):
+            elif _BODY_OVER.search(vision_analysis):
                 health_analysis["body_condition"] = "Overweight"
                 health_analysis["concerns"].append("Dog appears overweight - consider diet and exercise plan")
             
             # Coat condition
-            if any(word in analysis_lower for word in ["healthy coat", "shiny", "glossy", "well-groomed"]):
+            if _COAT_HEALTHY.search(vision_analysis):
                 health_analysis["coat_condition"] = "Healthy"
-            elif any(word in analysis_lower for word in ["dry", "dull", "matte", "dull coat"]):
+            elif _COAT_DRY.search(vision_analysis):
                 health_analysis["coat_condition"] = "Dry"
                 health_analysis["recommendations"].append("Coat appears dry - consider omega-3 supplements or dietary changes")
-            elif any(word in analysis_lower for word in ["matted", "tangled", "unkempt"]):
+            elif _COAT_MATTED.search(vision_analysis):
                 health_analysis["coat_condition"] = "Needs Grooming"
                 health_analysis["recommendations"].append("Coat needs grooming - regular brushing recommended")
-            elif any(word in analysis_lower for word in ["skin", "rash", "irritation", "redness", "sores"]):
+            elif _COAT_SKIN.search(vision_analysis):
                 health_analysis["coat_condition"] = "Skin Issues"
                 health_analysis["concerns"].append("Possible skin issues detected - consult with a veterinarian")
             
             # Eye condition
-            if any(word in analysis_lower for word in ["clear eyes", "bright", "alert"]):
+            if _EYES_CLEAR.search(vision_analysis):
                 health_analysis["eye_condition"] = "Normal"
-            elif any(word in analysis_lower for word in ["discharge", "tearing", "redness", "cloudy"]):
+            elif _EYES_ISSUE.search(vision_analysis):
                 health_analysis["eye_condition"] = "Needs Attention"
                 health_analysis["concerns"].append("Eye issues detected - monitor closely and consult vet if persists")
             
             # Energy level
-            if any(word in analysis_lower for word in ["alert", "energetic", "active", "playful"]):
+            if _ENERGY_HIGH.search(vision_analysis):
                 health_analysis["energy_level"] = "High"
-            elif any(word in analysis_lower for word in ["lethargic", "tired", "low energy", "sluggish"]):
+            elif _ENERGY_LOW.search(vision_analysis):
                 health_analysis["energy_level"] = "Low"
                 health_analysis["concerns"].append("Dog appears lethargic - monitor behavior and consult vet if concerned")
             
@@ -130,6 +180,10 @@ Provide a detailed health assessment in a structured format. Be specific about w
             elif len(health_analysis["recommendations"]) > 0:
                 health_analysis["overall_health"] = "Good with Recommendations"
             
+            _vision_cache[cache_key] = copy.deepcopy(health_analysis)
+            if len(_vision_cache) > _VISION_CACHE_SIZE:
+                _vision_cache.popitem(last=False)
+            
             return health_analysis
             
         except Exception as e:
@@ -140,7 +194,6 @@ Provide a detailed health assessment in a structured format. Be specific about w
     return analyze_health_cv(image_path, breed)
 
 def analyze_health_cv(image_path: str, breed: str = None) -> Dict[str, any]:
-    # Try to read image using PIL first (supports more formats like AVIF, WebP, etc.)
     try:
         if not os.path.exists(image_path):
             return {
@@ -150,11 +203,7 @@ def analyze_health_cv(image_path: str, breed: str = None) -> Dict[str, any]:
                 "concerns": []
             }
         
-        pil_img = Image.open(image_path).convert("RGB")
-        # Convert PIL image to numpy array for OpenCV
-        img_array = np.array(pil_img)
-        # Convert RGB to BGR for OpenCV
-        img = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+        img = read_image_bgr(image_path)
         
         if img is None or img.size == 0:
             raise ValueError("Image array is empty after conversion")
@@ -185,10 +234,9 @@ def analyze_health_cv(image_path: str, breed: str = None) -> Dict[str, any]:
         "energy_level": "Normal"
     }
     
-    # Convert to different color spaces for analysis
+    # Convert to grayscale for analysis
     try:
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
     except Exception as e:
         print(f"Error converting color spaces: {e}")
         return {
@@ -199,12 +247,9 @@ def analyze_health_cv(image_path: str, breed: str = None) -> Dict[str, any]:
         }
     
     # Analyze brightness and contrast
-    brightness = np.mean(gray) / 255.0
-    contrast = np.std(gray) / 255.0
-    
-    # Analyze color distribution (for coat health assessment)
-    mean_color = np.mean(img, axis=(0, 1))
-    color_variance = np.var(img, axis=(0, 1))
+    gray_mean, gray_std = cv2.meanStdDev(gray)
+    brightness = float(gray_mean[0, 0]) / 255.0
+    contrast = float(gray_std[0, 0]) / 255.0
     
     # Detect edges (for clarity and detail)
     edges = cv2.Canny(gray, 50, 150)
@@ -242,11 +287,14 @@ def _clean_breed_name(breed: str) -> str:
     """Remove ImageNet class prefix from breed name (e.g., 'n02106662 German shepherd' -> 'German shepherd')"""
     if not breed:
         return breed
-    # Remove ImageNet class ID prefix (format: n######## breed_name)
-    parts = breed.split(' ', 1)
-    if len(parts) > 1 and parts[0].startswith('n') and parts[0][1:].isdigit():
-        return parts[1]
-    return breed
+    m = _CLEAN_BREED_RE.match(breed)
+    return m.group(1) if m else breed
+
+@lru_cache(maxsize=256)
+def _cached_breed_detection_message(breed: str, breed_conf: float, dog_conf: float, recent_tail: tuple) -> str:
+    """Memoized get_breed_detection_message; recent_tail is a hashable (sender, text) snapshot"""
+    recent_messages = [{"sender": sender, "text": text} for sender, text in recent_tail]
+    return get_breed_detection_message(breed, breed_conf, dog_conf, recent_messages)
 
 def generate_health_summary(health_analysis: Dict, breed: str = None, breed_conf: float = 0.0, dog_conf: float = None, recent_messages: list = None) -> str:
     """
@@ -254,15 +302,14 @@ def generate_health_summary(health_analysis: Dict, breed: str = None, breed_conf
     Uses the new response_messages module for consistent, trust-building messages.
     Supports repetition tracking for adaptive responses.
     """
-    from services.response_messages import get_breed_detection_message
-    
     recent_messages = recent_messages or []
     
     if breed:
-        return get_breed_detection_message(breed, breed_conf, dog_conf, recent_messages)
+        # Callers pass only the last few messages, so the snapshot stays small
+        recent_tail = tuple((msg.get('sender'), msg.get('text')) for msg in recent_messages)
+        return _cached_breed_detection_message(breed, breed_conf, dog_conf, recent_tail)
     else:
         # No breed detected
-        from services.response_messages import LOW_CONFIDENCE_WARNING, _count_recent_message_type
         repetition_count = _count_recent_message_type(recent_messages, LOW_CONFIDENCE_WARNING)
         
         if repetition_count == 0:
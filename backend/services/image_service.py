@@ -1,45 +1,59 @@
 import os
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, List
 from PIL import Image
 
-def _calc_brightness(img: np.ndarray) -> float:
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    return float(gray.mean() / 255.0)
+# Keep each image's OpenCV work on one core; batches are parallelized by _POOL instead.
+# OpenCV releases the GIL inside native calls, so threads scale across images.
+cv2.setNumThreads(1)
+_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
 
-def _calc_clarity(img: np.ndarray) -> float:
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+# Formats OpenCV decodes natively; anything else (AVIF, HEIC, ...) goes through PIL
+_CV2_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+def read_image_bgr(path: str) -> np.ndarray:
+    """Decode an image file to a BGR array, using cv2.imdecode when the format allows it."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in _CV2_EXTENSIONS:
+        img = cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is not None:
+            return img
+    # PIL supports more formats like AVIF, WebP, etc.
+    return cv2.cvtColor(np.asarray(Image.open(path).convert("RGB")), cv2.COLOR_RGB2BGR)
+
+def _calc_clarity(gray: np.ndarray) -> float:
     var_lap = cv2.Laplacian(gray, cv2.CV_64F).var()
     # Normalize variance to 0..1 using soft scale
     score = 1.0 - np.exp(-var_lap / 500.0)
     return float(np.clip(score, 0.0, 1.0))
 
-def _calc_color_balance(img: np.ndarray) -> float:
+def _calc_metrics(img: np.ndarray) -> Tuple[float, float, float]:
+    # Per-channel means in a single pass; brightness and color balance both derive from them
+    mean, _ = cv2.meanStdDev(img)
+    b, g, r = mean.ravel()[:3]  # B,G,R
+    # BT.601 luma, same weights cv2.COLOR_BGR2GRAY uses
+    brightness = float((0.114 * b + 0.587 * g + 0.299 * r) / 255.0)
+
     # 1.0 = perfectly balanced channels
-    chans = cv2.mean(img)[:3]  # B,G,R
-    std = np.std(chans)
+    std = np.std((b, g, r))
     max_std = 40.0
-    score = 1.0 - min(std, max_std)/max_std
-    return float(np.clip(score, 0.0, 1.0))
+    color_balance = float(np.clip(1.0 - min(std, max_std)/max_std, 0.0, 1.0))
+
+    clarity = _calc_clarity(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    return brightness, clarity, color_balance
 
 def analyze_image(path: str) -> Tuple[float, float, float, str, List[str]]:
-    # Try to read image using PIL first (supports more formats like AVIF, WebP, etc.)
     try:
-        pil_img = Image.open(path).convert("RGB")
-        # Convert PIL image to numpy array for OpenCV
-        img_array = np.array(pil_img)
-        # Convert RGB to BGR for OpenCV
-        img = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+        img = read_image_bgr(path)
     except Exception as e:
         # Fallback to OpenCV's imread
         img = cv2.imread(path)
         if img is None:
             raise ValueError(f"Cannot read image: {str(e)}")
 
-    brightness = _calc_brightness(img)
-    clarity = _calc_clarity(img)
-    color_balance = _calc_color_balance(img)
+    brightness, clarity, color_balance = _calc_metrics(img)
 
     notes = []
     health_notes = []
@@ -85,3 +99,7 @@ def analyze_image(path: str) -> Tuple[float, float, float, str, List[str]]:
     ]
 
     return brightness, clarity, color_balance, summary, nutrition
+
+def analyze_images(paths: List[str]) -> List[Tuple[float, float, float, str, List[str]]]:
+    """Analyze several uploaded images in parallel on the shared worker pool."""
+    return list(_POOL.map(analyze_image, paths))
@@ -19,6 +19,25 @@ GREETING_PATTERNS = [
     r'^\s*(what\'?s?\s+up|sup|wassup)\s*[!?.]*\s*$',
 ]
 
+# First two characters of every phrase GREETING_PATTERNS can match.
+# Messages starting with anything else cannot be greetings, so the regexes are skipped.
+_GREETING_HEADS = frozenset((
+    "hi", "he", "na", "go", "mo", "af", "ev", "ni", "da", "ho", "wh", "su", "wa",
+))
+
+# Common exact greetings (trailing "!"/"." stripped) answered with a set lookup
+# before falling back to GREETING_PATTERNS
+_GREETING_SET = frozenset({
+    "hi", "hii", "hiii", "hiiii", "hello", "hey", "namaste", "namaskar", "howdy",
+    "sup", "wassup", "whats up", "what's up",
+    "morning", "afternoon", "evening", "night",
+    "good morning", "good afternoon", "good evening", "good night", "good day",
+    "hi there", "hello there", "hey there",
+    "hi everyone", "hello everyone", "hey everyone",
+    "hi all", "hello all", "hey all",
+    "hi guys", "hello guys", "hey guys",
+})
+
 # Minimum length for FAQ questions (very short = likely greeting)
 MIN_FAQ_LENGTH = 10
 MAX_GREETING_LENGTH = 50  # If longer, likely not a greeting
@@ -43,7 +62,7 @@ def detect_intent(
     Logic:
     1. If image present → IMAGE_QUERY (route to image analysis)
     2. If very short text → GREETING (instant response)
-    3. If matches greeting pattern → GREETING
+    3. If prefix can start a greeting and matches greeting pattern → GREETING
     4. Otherwise → FAQ_QUESTION (route to FAQ search)
     """
     # Step 1: Image routing (highest priority)
@@ -58,19 +77,15 @@ def detect_intent(
         return "GREETING"  # Treat as greeting for safety
     
     # Step 3: Length-based detection (very short = greeting)
-    if len(msg) < min_faq_length or len(msg) > MAX_GREETING_LENGTH:
-        # Check if it matches greeting pattern
-        msg_lower = msg.lower()
-        for pattern in GREETING_PATTERNS:
-            if re.match(pattern, msg_lower, re.IGNORECASE):
-                return "GREETING"
-        
-        # Very short but not a greeting pattern → still likely greeting
-        if len(msg) < min_faq_length:
-            return "GREETING"
+    if len(msg) < min_faq_length:
+        return "GREETING"
     
-    # Step 4: Pattern matching for greetings
+    # Step 4: Pattern matching for greetings (only if the prefix can start one)
     msg_lower = msg.lower()
+    if msg_lower[:2] not in _GREETING_HEADS:
+        return "FAQ_QUESTION"
+    if msg_lower.rstrip("!. ") in _GREETING_SET:
+        return "GREETING"
     for pattern in GREETING_PATTERNS:
         if re.match(pattern, msg_lower, re.IGNORECASE):
             return "GREETING"
@@ -1,99 +1,326 @@
 # llm_service.py - LLM Service (PostgreSQL version, no Firebase)
 
-from openai import OpenAI
 from dotenv import load_dotenv
+from cachetools import LRUCache, TTLCache
 import os
+import httpx
+import orjson
+import hashlib
+import logging
+import asyncio
+import threading
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Optional
+from database import SessionLocal
 from services.db_service import create_chat_message
+from services import response_disk_cache, semantic_cache
 from datetime import datetime, timezone
 import random
+import re
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick not installed; fall back to per-category regexes
+    ahocorasick = None
+from functools import lru_cache
+from itertools import islice
+from dataclasses import dataclass
 
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+EMPTY_QUESTION_REPLY = "Could you please ask a question about your pet?"
+
+def _is_trivial_question(question: str) -> bool:
+    q = question.strip()
+    return len(q) < 2 or not any(ch.isalnum() for ch in q)
+
+# Default fallback replies; only the chosen one is interpolated
+_DEFAULT_TEMPLATES = (
+    "Thank you for your question about {pet_name}. I'm here to help with dog health and care advice. Could you provide more details about what you'd like to know?",
+    "That's a great question! For {pet_name}, I'd recommend consulting the specific features in this app:\n\n- Use the Chat feature for detailed health questions\n- Check the Dashboard for your pet's profile\n- Use Nutrient Calculator for dietary needs\n\nFeel free to ask more specific questions!",
+    "I understand you're asking about {pet_name}. For the best advice, please:\n\n1. Ensure your pet's profile is complete\n2. Use specific questions (e.g., 'What should I feed my dog?')\n3. Check the Reports section for previous health information\n\nHow else can I help you today?",
+)
+
+@dataclass(slots=True)
+class ParsedRequest:
+    """Question and pet-profile fields normalized once per request"""
+    question: str
+    question_lower: str
+    pet_profile: dict
+    pet_name: str
+    breed: str
+    weight: str
+    age: str
+    gender: str
+    activity: str
+    medical_conditions: list
+    breed_lower: str
+    age_lower: str
+    activity_lower: str
+    profile_ctx: Optional[str] = None  # OpenAI profile block, built on first use
+
+def _lower(value) -> str:
+    return value.lower() if isinstance(value, str) else ''
+
+def _parse(question: str, pet_profile: dict) -> ParsedRequest:
+    profile = pet_profile or {}
+    breed = profile.get('breed', '')
+    age = profile.get('age', '')
+    activity = profile.get('activityLevel', 'Moderate')
+    return ParsedRequest(
+        question=question,
+        question_lower=question.lower().strip(),
+        pet_profile=profile,
+        pet_name=profile.get('petName', 'your dog'),
+        breed=breed,
+        weight=profile.get('weight', ''),
+        age=age,
+        gender=profile.get('gender', ''),
+        activity=activity,
+        medical_conditions=profile.get('medicalConditions', []),
+        breed_lower=_lower(breed),
+        age_lower=_lower(age),
+        activity_lower=_lower(activity),
+    )
+
+def _profile_context(req: ParsedRequest) -> str:
+    if req.profile_ctx is None:
+        req.profile_ctx = (
+            _cached_context(_render_profile_context, _profile_signature(req.pet_profile))
+            if req.pet_profile else ""
+        )
+    return req.profile_ctx
+
+def _default_answer(req: ParsedRequest) -> str:
+    return random.choice(_DEFAULT_TEMPLATES).format(pet_name=req.pet_name)
+
+def _fallback_answer(req: ParsedRequest) -> str:
+    # Topic questions share the FAQ keyword matcher; only the default reply lives here
+    return _faq_answer(req) or _default_answer(req)
 
 def generate_fallback_response(question: str, pet_profile: dict) -> str:
     """
     Generates a simple fallback response when OpenAI API is not available.
     This allows the app to work for testing without API key.
     """
-    question_lower = question.lower()
-    
-    # Pet profile context
-    pet_name = pet_profile.get('petName', 'your dog') if pet_profile else 'your dog'
-    breed = pet_profile.get('breed', '') if pet_profile else ''
-    
-    # Greeting responses
-    if any(word in question_lower for word in ['hi', 'hello', 'hey', 'namaste']):
-        return f"Hello! I'm here to help you with {pet_name}'s health and care. How can I assist you today?"
-    
-    # Health questions
-    if any(word in question_lower for word in ['health', 'sick', 'ill', 'problem', 'issue']):
-        return f"Regarding {pet_name}'s health, I recommend:\n\n1. Regular vet checkups every 6-12 months\n2. Monitor eating and drinking habits\n3. Watch for changes in behavior\n4. Keep vaccinations up to date\n\nIf you notice any concerning symptoms, please consult with a veterinarian immediately."
-    
-    # Nutrition questions
-    if any(word in question_lower for word in ['food', 'diet', 'eat', 'nutrition', 'meal', 'feed']):
-        breed_info = f" For {breed} breeds," if breed else ""
-        return f"Nutrition advice for {pet_name}:{breed_info}\n\n1. Feed high-quality dog food appropriate for their age and size\n2. Follow feeding guidelines on the food package\n3. Provide fresh water at all times\n4. Avoid human foods that can be toxic (chocolate, grapes, onions, etc.)\n5. Consider your dog's activity level when determining portion sizes\n\nFor specific nutritional needs, use the Nutrient Calculator feature in the app."
-    
-    # Exercise questions
-    if any(word in question_lower for word in ['exercise', 'walk', 'play', 'activity', 'fitness']):
-        activity = pet_profile.get('activityLevel', 'Moderate') if pet_profile else 'Moderate'
-        return f"Exercise recommendations for {pet_name}:\n\n1. Daily walks (30-60 minutes depending on breed and age)\n2. Playtime and interactive games\n3. Mental stimulation through training or puzzle toys\n4. Adjust activity based on weather and your dog's {activity.lower()} activity level\n5. Watch for signs of fatigue or overheating"
-    
-    # Behavior questions
-    if any(word in question_lower for word in ['behavior', 'behave', 'training', 'train', 'obey']):
-        return f"Behavior and training tips for {pet_name}:\n\n1. Positive reinforcement works best\n2. Be consistent with commands and rules\n3. Socialize your dog from an early age\n4. Provide mental stimulation to prevent boredom\n5. Consider professional training if needed\n\nRemember, patience and consistency are key to successful training."
-    
-    # General care
-    if any(word in question_lower for word in ['care', 'grooming', 'bath', 'clean']):
-        return f"General care tips for {pet_name}:\n\n1. Regular grooming based on coat type\n2. Brush teeth regularly to prevent dental issues\n3. Trim nails when needed\n4. Check ears for signs of infection\n5. Keep living area clean and comfortable\n6. Provide a safe and secure environment"
-    
-    # Default response
-    responses = [
-        f"Thank you for your question about {pet_name}. I'm here to help with dog health and care advice. Could you provide more details about what you'd like to know?",
-        f"That's a great question! For {pet_name}, I'd recommend consulting the specific features in this app:\n\n- Use the Chat feature for detailed health questions\n- Check the Dashboard for your pet's profile\n- Use Nutrient Calculator for dietary needs\n\nFeel free to ask more specific questions!",
-        f"I understand you're asking about {pet_name}. For the best advice, please:\n\n1. Ensure your pet's profile is complete\n2. Use specific questions (e.g., 'What should I feed my dog?')\n3. Check the Reports section for previous health information\n\nHow else can I help you today?"
-    ]
-    
-    return random.choice(responses)
+    return _fallback_answer(_parse(question, pet_profile))
 
-# Get OpenAI API key
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# OpenAI key and clients are resolved on first use, so importing this module
+# (migrations, scripts, FAQ-only answers) doesn't read .env, import the openai
+# package or build HTTP clients
+@lru_cache(maxsize=1)
+def _openai_api_key() -> Optional[str]:
+    load_dotenv()
+    key = os.getenv("OPENAI_API_KEY")
+    if key and key != "your-openai-api-key-here":
+        return key
+    logger.warning("OpenAI API key not set. AI responses will not work.")
+    return None
 
-# Create OpenAI client only if API key is set
-if OPENAI_API_KEY and OPENAI_API_KEY != "your-openai-api-key-here":
-    client = OpenAI(api_key=OPENAI_API_KEY)
-else:
-    client = None
-    print("WARNING: OpenAI API key not set. AI responses will not work.")
+@lru_cache(maxsize=1)
+def _get_async_client() -> Optional["AsyncOpenAI"]:
+    key = _openai_api_key()
+    if not key:
+        return None
+    from openai import AsyncOpenAI
+    # One pooled HTTP/2 client for every chat call: keep-alive connections
+    # skip the TCP+TLS handshake and concurrent requests share a connection
+    return AsyncOpenAI(
+        api_key=key,
+        # Transient 429/5xx/connection errors are retried with backoff before falling back
+        max_retries=3,
+        http_client=httpx.AsyncClient(
+            http2=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+        ),
+    )
+
+async def close_openai_client() -> None:
+    """Close the pooled OpenAI connections (app shutdown); no-op if none were opened"""
+    if _get_async_client.cache_info().currsize:
+        client = _get_async_client()
+        _get_async_client.cache_clear()
+        if client is not None:
+            await client.close()
+
+# Exact-match cache of OpenAI answers: identical question + context within the TTL
+# is answered without another API call
+_response_cache = TTLCache(maxsize=2048, ttl=3600)
+_response_cache_lock = threading.Lock()
+_cache_hits = 0
+_cache_misses = 0
+_ORJSON_KEY_OPTS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+
+_HISTORY_TURNS = 5  # exchanges of chat history sent to OpenAI (and keyed in the cache)
+
+def _recent_turns(history):
+    """Last _HISTORY_TURNS exchanges without copying the list (also accepts a deque)"""
+    return islice(history, max(0, len(history) - _HISTORY_TURNS), None)
+
+def _context_cache_key(history: list, location: Optional[str], pet_profile: dict, image_analysis_context: Optional[dict], faq_context: str = "") -> bytes:
+    """Digest of everything besides the question that shapes the answer"""
+    raw = b"|".join((
+        orjson.dumps(pet_profile, option=_ORJSON_KEY_OPTS) if pet_profile else b"",
+        (location or "").encode(),
+        orjson.dumps(image_analysis_context, option=_ORJSON_KEY_OPTS) if image_analysis_context else b"",
+        orjson.dumps(list(_recent_turns(history)), option=_ORJSON_KEY_OPTS) if history else b"",
+    ))
+    if faq_context:
+        # FAQ-grounded answers get their own keys, apart from plain chat answers
+        raw += b"|faq|" + faq_context.encode()
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+def _response_cache_key(question: str, context_key: bytes) -> bytes:
+    return hashlib.blake2b(question.strip().lower().encode() + b"|" + context_key, digest_size=16).digest()
+
+def _get_cached_response(key: bytes) -> Optional[str]:
+    global _cache_hits, _cache_misses
+    with _response_cache_lock:
+        answer = _response_cache.get(key)
+        if answer is None:
+            _cache_misses += 1
+        else:
+            _cache_hits += 1
+        return answer
+
+def _set_cached_response(key: bytes, answer: str) -> None:
+    with _response_cache_lock:
+        _response_cache[key] = answer
+
+# Single-flight: concurrent identical requests share one in-progress OpenAI call
+_inflight_requests: dict = {}
+
+def cache_stats() -> dict:
+    """Hit/miss counters for the OpenAI response cache"""
+    with _response_cache_lock:
+        return {"hits": _cache_hits, "misses": _cache_misses, "size": len(_response_cache)}
+
+# Background writer for chat messages: handlers enqueue the insert and return
+# without waiting on the DB round-trip (started/stopped by the app lifecycle)
+_db_write_queue: Optional[asyncio.Queue] = None
+_db_writer_task: Optional[asyncio.Task] = None
+
+def _write_chat_message(pet_id: int, sender_id: str, text: str, image_url: Optional[str]):
+    """Insert a chat message using a dedicated session (runs in the executor)"""
+    db = SessionLocal()
+    try:
+        return create_chat_message(db, pet_id, sender_id, text, image_url=image_url)
+    finally:
+        db.close()
+
+async def _db_writer():
+    loop = asyncio.get_running_loop()
+    # Held locally: stop_db_writer clears the module global while the task winds down
+    queue = _db_write_queue
+    while True:
+        pet_id, sender_id, text, image_url, done = await queue.get()
+        try:
+            message = await loop.run_in_executor(None, _write_chat_message, pet_id, sender_id, text, image_url)
+            # A flush=True caller may have been cancelled (e.g. client disconnected) meanwhile
+            if done is not None and not done.done():
+                done.set_result(message)
+        except Exception as e:
+            logger.error("Error writing chat message to database: %s", e)
+            if done is not None and not done.done():
+                done.set_exception(e)
+        finally:
+            queue.task_done()
+
+def start_db_writer():
+    """Start the background chat-message writer (call from app startup)"""
+    global _db_write_queue, _db_writer_task
+    if _db_writer_task is None:
+        _db_write_queue = asyncio.Queue()
+        _db_writer_task = asyncio.create_task(_db_writer())
+
+async def stop_db_writer():
+    """Drain pending writes and stop the writer (call from app shutdown)"""
+    global _db_write_queue, _db_writer_task
+    if _db_writer_task is not None:
+        await _db_write_queue.join()
+        _db_writer_task.cancel()
+        _db_write_queue, _db_writer_task = None, None
 
 async def write_ai_message_to_database(
     db: Session,
     pet_id: int,
     content: str | dict,
     sender_is_user: bool = False,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    flush: bool = False
 ):
     """
     Writes a message to the database.
     'content' can be a string (AI message) or a dict (User upload message with image_url).
-    Returns the created ChatMessage object.
+    The insert is queued for the background writer and None is returned immediately;
+    pass flush=True to wait for the commit and get the created ChatMessage object.
     """
-    from services.db_service import create_chat_message
-    
     sender_id = str(user_id) if sender_is_user and user_id else "ai_bot"
     
     if isinstance(content, dict):
         text = content.get("text", "")
         image_url = content.get("image_url")
-        message = create_chat_message(db, pet_id, sender_id, text, image_url=image_url)
     elif isinstance(content, str):
-        message = create_chat_message(db, pet_id, sender_id, content)
+        text = content
+        image_url = None
     else:
-        print(f"Warning: Invalid content type ({type(content)}) for database message.")
+        logger.warning("Invalid content type (%s) for database message.", type(content))
         return None
     
-    return message
+    # Writer not running (e.g. scripts outside the app) - write inline
+    if _db_writer_task is None:
+        return create_chat_message(db, pet_id, sender_id, text, image_url=image_url)
+    
+    done = asyncio.get_running_loop().create_future() if flush else None
+    await _db_write_queue.put((pet_id, sender_id, text, image_url, done))
+    if done is None:
+        return None
+    return await done
+
+# Breed advice rules per category, checked in order; a rule matches when any
+# of its names appears in the lowercased breed
+_BREED_ADVICE = {
+    "nutrition": (
+        (("labrador", "retriever"), "Labradors/Retrievers tend to gain weight easily, so portion control is important. They benefit from high-protein, low-fat diets."),
+        (("poodle",), "Poodles do well on high-quality protein and omega-3 fatty acids for their curly coat health."),
+        (("beagle",), "Beagles are food-motivated and prone to overeating. Use measured portions and consider puzzle feeders."),
+        (("bulldog", "pug"), "Brachycephalic breeds (flat-faced) may need smaller kibble and should eat slowly to prevent choking."),
+        (("husky", "malamute"), "Northern breeds have high energy needs. Feed high-quality, high-protein food suitable for active dogs."),
+        (("chihuahua",), "Small breeds like Chihuahuas need nutrient-dense food in smaller portions. Consider small-breed formulas."),
+        (("great dane", "mastiff"), "Large/giant breeds need controlled growth diets to prevent joint issues. Look for large-breed puppy formulas if young."),
+    ),
+    "exercise": (
+        (("labrador", "retriever"), "These active breeds need 60-90 minutes of exercise daily, including swimming and fetch."),
+        (("husky", "malamute"), "Northern breeds require extensive exercise (90+ minutes). They excel at running, hiking, and pulling activities."),
+        (("border collie", "australian shepherd"), "Herding breeds need both physical and mental exercise. Include training, puzzles, and agility work."),
+        (("bulldog", "pug"), "Brachycephalic breeds should avoid intense exercise, especially in heat. Short, gentle walks are best."),
+        (("chihuahua",), "Small breeds need moderate exercise. Indoor play and short walks (15-30 min) are usually sufficient."),
+        (("basset hound", "dachshund"), "Low-energy breeds need moderate exercise. Avoid activities that stress their long backs."),
+    ),
+    "health": (
+        (("bulldog", "pug"), "Watch for breathing issues, skin fold infections, and eye problems common in brachycephalic breeds."),
+        (("labrador",), "Monitor for hip dysplasia, obesity, and ear infections. Regular exercise and weight management are crucial."),
+        (("german shepherd",), "Prone to hip dysplasia and joint issues. Maintain healthy weight and provide joint supplements as recommended."),
+        (("dachshund",), "IVDD (intervertebral disc disease) is a major concern. Avoid jumping and support their back when lifting."),
+        (("golden retriever",), "Common issues include hip dysplasia, cancer, and skin allergies. Regular vet checkups are essential."),
+    ),
+    "grooming": (
+        (("poodle", "bichon"), "Curly-coated breeds need regular brushing (daily) and professional grooming every 4-6 weeks."),
+        (("husky", "malamute"), "Double-coated breeds shed heavily seasonally. Regular brushing (2-3 times/week) helps manage shedding."),
+        (("smooth coat", "beagle"), "Short-haired breeds need minimal grooming - weekly brushing is usually sufficient."),
+        (("golden retriever",), "Long, dense coats need regular brushing (3-4 times/week) to prevent matting and reduce shedding."),
+    ),
+}
+
+@lru_cache(maxsize=512)
+def _breed_advice(breed_lower: str, category: str) -> str:
+    for names, advice in _BREED_ADVICE.get(category, ()):
+        if any(name in breed_lower for name in names):
+            return advice
+    return ""
 
 def get_breed_specific_advice(breed: str, category: str) -> str:
     """
@@ -102,326 +329,380 @@ def get_breed_specific_advice(breed: str, category: str) -> str:
     """
     if not breed:
         return ""
+    return _breed_advice(breed.lower(), category)
+
+# FAQ keyword groups in priority order: when a question hits several groups,
+# the earliest group wins. Keywords are matched as substrings of the question.
+_FAQ_KEYWORDS = (
+    ("greeting", ['hi', 'hello', 'hey', 'namaste']),
+    ("health", ['health', 'sick', 'ill', 'problem', 'issue', 'symptom', 'veterinarian', 'vet']),
+    ("nutrition", ['food', 'diet', 'eat', 'nutrition', 'meal', 'feed', 'feeding', 'portion']),
+    ("exercise", ['exercise', 'walk', 'play', 'activity', 'fitness', 'workout']),
+    ("behavior", ['behavior', 'behave', 'training', 'train', 'obey', 'discipline']),
+    ("care", ['care', 'grooming', 'bath', 'clean', 'brush', 'nail']),
+)
+_FAQ_GREETING_ID = 0  # category ids are positions in _FAQ_KEYWORDS
+
+def _build_faq_automaton():
+    """Build one Aho-Corasick automaton mapping every FAQ keyword to its group priority."""
+    automaton = ahocorasick.Automaton()
+    for priority, (_, words) in enumerate(_FAQ_KEYWORDS):
+        for word in words:
+            if not automaton.exists(word):
+                automaton.add_word(word, priority)
+    automaton.make_automaton()
+    return automaton
+
+if ahocorasick is not None:
+    _FAQ_AUTOMATON = _build_faq_automaton()
+    _FAQ_REGEX = None
+else:
+    # One compiled pattern for all groups: a zero-width lookahead is tried at every
+    # position, so overlapping keywords are all seen (substring match, like `in`);
+    # group i+1 is category id i, alternatives in priority order
+    _FAQ_AUTOMATON = None
+    _FAQ_REGEX = re.compile("(?=" + "|".join(
+        "(" + "|".join(re.escape(word) for word in words) + ")"
+        for _, words in _FAQ_KEYWORDS
+    ) + ")")
+
+@lru_cache(maxsize=4096)
+def _match_faq_category(question_lower: str) -> Optional[int]:
+    """Single pass over the question; returns the id of the highest-priority matching group."""
+    if _FAQ_AUTOMATON is None:
+        matches = (m.lastindex - 1 for m in _FAQ_REGEX.finditer(question_lower))
+    else:
+        matches = (priority for _, priority in _FAQ_AUTOMATON.iter(question_lower))
+    best = None
+    for priority in matches:
+        if best is None or priority < best:
+            best = priority
+            if best == 0:
+                break
+    return best
+
+# Exact-match profile values, hashed once
+_UNKNOWN_BREEDS = frozenset(('unknown', 'unknown breed', ''))
+_HIGH_ACTIVITY = frozenset(('high', 'very high', 'active'))
+_LOW_ACTIVITY = frozenset(('low', 'sedentary'))
+
+# Substring terms matched against the lowercased age / breed (order matters)
+_NUTRITION_PUPPY_TERMS = ('puppy', 'young', 'baby')
+_NUTRITION_SENIOR_TERMS = ('senior', 'old', 'elder')
+_EXERCISE_PUPPY_TERMS = ('puppy', 'young')
+_EXERCISE_SENIOR_TERMS = ('senior', 'old')
+_INDEPENDENT_BREEDS = ('husky', 'malamute', 'shiba')
+_HERDING_BREEDS = ('border collie', 'australian shepherd', 'german shepherd')
+_RETRIEVER_BREEDS = ('retriever', 'labrador', 'golden')
+# Medical conditions worth calling out in diet / exercise answers (substring, any case)
+_DIET_CONDITIONS_RE = re.compile(r"kidney|diabetes|allergy|obesity|weight", re.IGNORECASE)
+_EXERCISE_CONDITIONS_RE = re.compile(r"joint|hip|arthritis|heart|respiratory", re.IGNORECASE)
+
+# Whole-answer templates for the FAQ topics, filled with one format_map call;
+# optional lines are small templates rendered into their {..._block}/{..._line}
+# slot, or left empty
+_GREETING_TEMPLATE = "Hello! I'm here to help you with {pet_name}'s health and care.{breed_block} How can I assist you today?"
+_GREETING_BREED = " I see {pet_name} is a {breed}."
+
+_HEALTH_TEMPLATE = (
+    "Regarding {pet_name}'s health:\n\n"
+    "{breed_block}"
+    "General Health Recommendations:\n"
+    "1. Regular vet checkups every 6-12 months\n"
+    "2. Monitor eating and drinking habits daily\n"
+    "3. Watch for changes in behavior or energy levels\n"
+    "4. Keep vaccinations and preventatives up to date\n"
+    "{conditions_block}"
+    "\n⚠️ If you notice concerning symptoms, please consult with a veterinarian immediately."
+)
+_HEALTH_BREED = "🔸 Breed-specific considerations: {advice}\n\n"
+_HEALTH_CONDITIONS = (
+    "\n📋 Important: Since {pet_name} has {conditions}, "
+    "please follow your veterinarian's specific care instructions and monitor these conditions closely.\n"
+)
+
+_NUTRITION_TEMPLATE = (
+    "Nutrition advice for {pet_name}:\n\n"
+    "{breed_block}"
+    "General Nutrition Guidelines:\n"
+    "{age_line}"
+    "{weight_line}"
+    "3. Provide fresh water at all times\n"
+    "4. Avoid toxic human foods (chocolate, grapes, onions, xylitol, etc.)\n"
+    "{activity_line}"
+    "{conditions_block}"
+    "\n💡 For specific nutritional calculations, use the Nutrient Calculator feature in the app."
+)
+_NUTRITION_BREED = "🔸 Breed-specific guidance: {advice}\n\n"
+_NUTRITION_AGE_PUPPY = "1. {pet_name} is a puppy - feed high-quality puppy formula for proper growth\n"
+_NUTRITION_AGE_SENIOR = "1. {pet_name} is a senior - consider senior formulas with joint support and lower calories\n"
+_NUTRITION_AGE_ADULT = "1. Feed high-quality adult dog food appropriate for their size\n"
+_NUTRITION_AGE_UNKNOWN = "1. Feed high-quality dog food appropriate for their age and size\n"
+_NUTRITION_WEIGHT = "2. Current weight: {weight} - adjust portions to maintain healthy weight\n"
+_NUTRITION_WEIGHT_UNKNOWN = "2. Follow feeding guidelines on the food package based on ideal weight\n"
+_NUTRITION_ACTIVITY_HIGH = "5. {pet_name} has high activity level - may need more calories\n"
+_NUTRITION_ACTIVITY_LOW = "5. {pet_name} has low activity level - monitor portions to prevent weight gain\n"
+_NUTRITION_ACTIVITY_OTHER = "5. Adjust portions based on {pet_name}'s {activity} activity level\n"
+_NUTRITION_CONDITIONS = (
+    "\n⚠️ Special dietary considerations: {pet_name} has {conditions}. "
+    "Please follow your veterinarian's dietary recommendations.\n"
+)
+
+_EXERCISE_TEMPLATE = (
+    "Exercise recommendations for {pet_name}:\n\n"
+    "{breed_block}"
+    "{age_line}"
+    "2. Interactive playtime and games (fetch, tug-of-war)\n"
+    "3. Mental stimulation through training or puzzle toys\n"
+    "{activity_line}"
+    "5. Watch for signs of fatigue, overheating, or limping\n"
+    "{conditions_block}"
+)
+_EXERCISE_BREED = "🔸 Breed-specific activity needs: {advice}\n\n"
+_EXERCISE_AGE_PUPPY = (
+    "1. {pet_name} is a puppy - short, frequent play sessions (5-10 min, multiple times/day)\n"
+    "   Avoid excessive exercise to protect growing joints\n"
+)
+_EXERCISE_AGE_SENIOR = (
+    "1. {pet_name} is a senior - gentle, low-impact exercise (20-30 min/day)\n"
+    "   Swimming and short walks are ideal\n"
+)
+_EXERCISE_AGE_ADULT = "1. Daily walks (30-60 minutes depending on breed and size)\n"
+_EXERCISE_AGE_UNKNOWN = "1. Daily walks (30-60 minutes depending on breed and age)\n"
+_EXERCISE_ACTIVITY = "4. Adjust intensity based on {pet_name}'s {activity} activity level\n"
+_EXERCISE_ACTIVITY_UNKNOWN = "4. Adjust activity based on weather and your dog's activity level\n"
+_EXERCISE_CONDITIONS = (
+    "\n⚠️ Exercise restrictions: {pet_name} has {conditions}. "
+    "Consult your veterinarian for appropriate exercise guidelines.\n"
+)
+
+_BEHAVIOR_TEMPLATE = (
+    "Behavior and training tips for {pet_name}:\n\n"
+    "{breed_block}"
+    "General Training Guidelines:\n"
+    "1. Use positive reinforcement (treats, praise) - works best for all dogs\n"
+    "2. Be consistent with commands and rules across all family members\n"
+    "3. Socialize early and regularly (especially important for puppies)\n"
+    "4. Provide mental stimulation to prevent boredom and destructive behavior\n"
+    "5. Consider professional training classes if needed\n"
+    "6. Keep training sessions short (5-15 minutes) and fun\n"
+    "\n💡 Remember: Patience and consistency are key to successful training!"
+)
+_BEHAVIOR_INDEPENDENT = "🔸 {breed} breeds can be independent - be patient and consistent\n"
+_BEHAVIOR_HERDING = "🔸 {breed} breeds are highly intelligent - provide mental challenges\n"
+_BEHAVIOR_RETRIEVER = "🔸 {breed} breeds respond well to positive reinforcement and treats\n"
+
+_CARE_TEMPLATE = (
+    "General care tips for {pet_name}:\n\n"
+    "{breed_block}"
+    "General Care Checklist:\n"
+    "1. Regular grooming based on coat type (weekly to daily brushing)\n"
+    "2. Brush teeth regularly (daily ideal, minimum 2-3 times/week) to prevent dental issues\n"
+    "3. Trim nails when they click on the floor (every 2-4 weeks typically)\n"
+    "4. Check ears weekly for signs of infection (redness, odor, discharge)\n"
+    "5. Keep living area clean and comfortable\n"
+    "6. Provide a safe, secure environment\n"
+    "7. Regular baths (monthly or as needed based on activity and coat type)\n"
+)
+_CARE_BREED = "🔸 Breed-specific grooming: {advice}\n\n"
+
+def _breed_block(template: str, breed_lower: str, category: str) -> str:
+    advice = _breed_advice(breed_lower, category)
+    return template.format(advice=advice) if advice else ""
+
+def _faq_greeting(req: ParsedRequest) -> str:
+    ctx = {"pet_name": req.pet_name, "breed": req.breed, "breed_block": ""}
+    if req.breed and req.breed_lower not in _UNKNOWN_BREEDS:
+        ctx["breed_block"] = _GREETING_BREED.format_map(ctx)
+    return _GREETING_TEMPLATE.format_map(ctx)
+
+def _faq_health(req: ParsedRequest) -> str:
+    ctx = {
+        "pet_name": req.pet_name,
+        "breed_block": _breed_block(_HEALTH_BREED, req.breed_lower, "health"),
+        "conditions_block": "",
+    }
     
-    breed_lower = breed.lower()
-    
-    # Breed-specific nutrition advice
-    if category == "nutrition":
-        if "labrador" in breed_lower or "retriever" in breed_lower:
-            return "Labradors/Retrievers tend to gain weight easily, so portion control is important. They benefit from high-protein, low-fat diets."
-        elif "poodle" in breed_lower:
-            return "Poodles do well on high-quality protein and omega-3 fatty acids for their curly coat health."
-        elif "beagle" in breed_lower:
-            return "Beagles are food-motivated and prone to overeating. Use measured portions and consider puzzle feeders."
-        elif "bulldog" in breed_lower or "pug" in breed_lower:
-            return "Brachycephalic breeds (flat-faced) may need smaller kibble and should eat slowly to prevent choking."
-        elif "husky" in breed_lower or "malamute" in breed_lower:
-            return "Northern breeds have high energy needs. Feed high-quality, high-protein food suitable for active dogs."
-        elif "chihuahua" in breed_lower:
-            return "Small breeds like Chihuahuas need nutrient-dense food in smaller portions. Consider small-breed formulas."
-        elif "great dane" in breed_lower or "mastiff" in breed_lower:
-            return "Large/giant breeds need controlled growth diets to prevent joint issues. Look for large-breed puppy formulas if young."
-    
-    # Breed-specific exercise advice
-    elif category == "exercise":
-        if "labrador" in breed_lower or "retriever" in breed_lower:
-            return "These active breeds need 60-90 minutes of exercise daily, including swimming and fetch."
-        elif "husky" in breed_lower or "malamute" in breed_lower:
-            return "Northern breeds require extensive exercise (90+ minutes). They excel at running, hiking, and pulling activities."
-        elif "border collie" in breed_lower or "australian shepherd" in breed_lower:
-            return "Herding breeds need both physical and mental exercise. Include training, puzzles, and agility work."
-        elif "bulldog" in breed_lower or "pug" in breed_lower:
-            return "Brachycephalic breeds should avoid intense exercise, especially in heat. Short, gentle walks are best."
-        elif "chihuahua" in breed_lower:
-            return "Small breeds need moderate exercise. Indoor play and short walks (15-30 min) are usually sufficient."
-        elif "basset hound" in breed_lower or "dachshund" in breed_lower:
-            return "Low-energy breeds need moderate exercise. Avoid activities that stress their long backs."
-    
-    # Breed-specific health advice
-    elif category == "health":
-        if "bulldog" in breed_lower or "pug" in breed_lower:
-            return "Watch for breathing issues, skin fold infections, and eye problems common in brachycephalic breeds."
-        elif "labrador" in breed_lower:
-            return "Monitor for hip dysplasia, obesity, and ear infections. Regular exercise and weight management are crucial."
-        elif "german shepherd" in breed_lower:
-            return "Prone to hip dysplasia and joint issues. Maintain healthy weight and provide joint supplements as recommended."
-        elif "dachshund" in breed_lower:
-            return "IVDD (intervertebral disc disease) is a major concern. Avoid jumping and support their back when lifting."
-        elif "golden retriever" in breed_lower:
-            return "Common issues include hip dysplasia, cancer, and skin allergies. Regular vet checkups are essential."
-    
-    # Breed-specific grooming advice
-    elif category == "grooming":
-        if "poodle" in breed_lower or "bichon" in breed_lower:
-            return "Curly-coated breeds need regular brushing (daily) and professional grooming every 4-6 weeks."
-        elif "husky" in breed_lower or "malamute" in breed_lower:
-            return "Double-coated breeds shed heavily seasonally. Regular brushing (2-3 times/week) helps manage shedding."
-        elif "smooth coat" in breed_lower or "beagle" in breed_lower:
-            return "Short-haired breeds need minimal grooming - weekly brushing is usually sufficient."
-        elif "golden retriever" in breed_lower:
-            return "Long, dense coats need regular brushing (3-4 times/week) to prevent matting and reduce shedding."
+    # Add medical condition-specific note
+    if req.medical_conditions:
+        ctx["conditions"] = ', '.join(req.medical_conditions)
+        ctx["conditions_block"] = _HEALTH_CONDITIONS.format_map(ctx)
     
-    return ""
+    return _HEALTH_TEMPLATE.format_map(ctx)
 
-def check_faq_match(question: str, pet_profile: dict) -> Optional[str]:
-    """
-    Check if the question matches common FAQ patterns and return personalized response.
-    Uses pet profile data and breed-specific advice when available.
-    Returns None if no match found, otherwise returns the response.
-    """
-    question_lower = question.lower().strip()
-    
-    # Extract pet profile context
-    pet_name = pet_profile.get('petName', 'your dog') if pet_profile else 'your dog'
-    breed = pet_profile.get('breed', '') if pet_profile else ''
-    weight = pet_profile.get('weight', '') if pet_profile else ''
-    age = pet_profile.get('age', '') if pet_profile else ''
-    gender = pet_profile.get('gender', '') if pet_profile else ''
-    activity = pet_profile.get('activityLevel', 'Moderate') if pet_profile else 'Moderate'
-    medical_conditions = pet_profile.get('medicalConditions', []) if pet_profile else []
-    goals = pet_profile.get('goals', []) if pet_profile else []
-    
-    # Helper to format pet context
-    def get_pet_context():
-        context_parts = []
-        if breed and breed.lower() not in ['unknown', 'unknown breed', '']:
-            context_parts.append(f"Breed: {breed}")
-        if age:
-            context_parts.append(f"Age: {age}")
-        if weight:
-            context_parts.append(f"Weight: {weight}")
-        if gender:
-            context_parts.append(f"Gender: {gender}")
-        if medical_conditions:
-            context_parts.append(f"Medical Conditions: {', '.join(medical_conditions)}")
-        return " | ".join(context_parts) if context_parts else None
-    
-    pet_context = get_pet_context()
-    context_note = f"\n\n*Based on {pet_name}'s profile: {pet_context}*" if pet_context else ""
-    
-    # Greeting responses
-    if any(word in question_lower for word in ['hi', 'hello', 'hey', 'namaste']):
-        intro = f"Hello! I'm here to help you with {pet_name}'s health and care."
-        if breed and breed.lower() not in ['unknown', 'unknown breed', '']:
-            intro += f" I see {pet_name} is a {breed}."
-        intro += " How can I assist you today?"
-        return intro
-    
-    # Health questions - highly personalized
-    if any(word in question_lower for word in ['health', 'sick', 'ill', 'problem', 'issue', 'symptom', 'veterinarian', 'vet']):
-        response = f"Regarding {pet_name}'s health:\n\n"
-        
-        # Add breed-specific health advice
-        breed_health = get_breed_specific_advice(breed, "health")
-        if breed_health:
-            response += f"🔸 Breed-specific considerations: {breed_health}\n\n"
-        
-        response += "General Health Recommendations:\n"
-        response += "1. Regular vet checkups every 6-12 months\n"
-        response += "2. Monitor eating and drinking habits daily\n"
-        response += "3. Watch for changes in behavior or energy levels\n"
-        response += "4. Keep vaccinations and preventatives up to date\n"
-        
-        # Add medical condition-specific note
-        if medical_conditions:
-            response += f"\n📋 Important: Since {pet_name} has {', '.join(medical_conditions)}, "
-            response += "please follow your veterinarian's specific care instructions and monitor these conditions closely.\n"
-        
-        response += "\n⚠️ If you notice concerning symptoms, please consult with a veterinarian immediately."
-        return response + context_note
+def _faq_nutrition(req: ParsedRequest) -> str:
+    ctx = {
+        "pet_name": req.pet_name,
+        "weight": req.weight,
+        "activity": req.activity_lower,
+        "breed_block": _breed_block(_NUTRITION_BREED, req.breed_lower, "nutrition"),
+        "activity_line": "",
+        "conditions_block": "",
+    }
     
-    # Nutrition questions - highly personalized
-    if any(word in question_lower for word in ['food', 'diet', 'eat', 'nutrition', 'meal', 'feed', 'feeding', 'portion']):
-        response = f"Nutrition advice for {pet_name}:\n\n"
-        
-        # Add breed-specific nutrition advice
-        breed_nutrition = get_breed_specific_advice(breed, "nutrition")
-        if breed_nutrition:
-            response += f"🔸 Breed-specific guidance: {breed_nutrition}\n\n"
-        
-        response += "General Nutrition Guidelines:\n"
-        
-        # Age-specific advice
-        if age:
-            if any(term in age.lower() for term in ['puppy', 'young', 'baby']):
-                response += f"1. {pet_name} is a puppy - feed high-quality puppy formula for proper growth\n"
-            elif any(term in age.lower() for term in ['senior', 'old', 'elder']):
-                response += f"1. {pet_name} is a senior - consider senior formulas with joint support and lower calories\n"
-            else:
-                response += "1. Feed high-quality adult dog food appropriate for their size\n"
-        else:
-            response += "1. Feed high-quality dog food appropriate for their age and size\n"
-        
-        # Weight-specific advice
-        if weight:
-            response += f"2. Current weight: {weight} - adjust portions to maintain healthy weight\n"
+    # Age-specific advice
+    if req.age:
+        if any(term in req.age_lower for term in _NUTRITION_PUPPY_TERMS):
+            age_line = _NUTRITION_AGE_PUPPY
+        elif any(term in req.age_lower for term in _NUTRITION_SENIOR_TERMS):
+            age_line = _NUTRITION_AGE_SENIOR
         else:
-            response += "2. Follow feeding guidelines on the food package based on ideal weight\n"
-        
-        response += "3. Provide fresh water at all times\n"
-        response += "4. Avoid toxic human foods (chocolate, grapes, onions, xylitol, etc.)\n"
-        
-        # Activity level-based portion advice
-        if activity:
-            activity_lower = activity.lower()
-            if activity_lower in ['high', 'very high', 'active']:
-                response += f"5. {pet_name} has high activity level - may need more calories\n"
-            elif activity_lower in ['low', 'sedentary']:
-                response += f"5. {pet_name} has low activity level - monitor portions to prevent weight gain\n"
-            else:
-                response += f"5. Adjust portions based on {pet_name}'s {activity.lower()} activity level\n"
-        
-        # Medical conditions affecting diet
-        if medical_conditions:
-            diet_conditions = [mc for mc in medical_conditions if any(term in mc.lower() for term in ['kidney', 'diabetes', 'allergy', 'obesity', 'weight'])]
-            if diet_conditions:
-                response += f"\n⚠️ Special dietary considerations: {pet_name} has {', '.join(diet_conditions)}. "
-                response += "Please follow your veterinarian's dietary recommendations.\n"
-        
-        response += "\n💡 For specific nutritional calculations, use the Nutrient Calculator feature in the app."
-        return response + context_note
+            age_line = _NUTRITION_AGE_ADULT
+    else:
+        age_line = _NUTRITION_AGE_UNKNOWN
+    ctx["age_line"] = age_line.format_map(ctx)
     
-    # Exercise questions - highly personalized
-    if any(word in question_lower for word in ['exercise', 'walk', 'play', 'activity', 'fitness', 'workout']):
-        response = f"Exercise recommendations for {pet_name}:\n\n"
-        
-        # Add breed-specific exercise advice
-        breed_exercise = get_breed_specific_advice(breed, "exercise")
-        if breed_exercise:
-            response += f"🔸 Breed-specific activity needs: {breed_exercise}\n\n"
-        
-        # Age-based exercise
-        if age:
-            if any(term in age.lower() for term in ['puppy', 'young']):
-                response += f"1. {pet_name} is a puppy - short, frequent play sessions (5-10 min, multiple times/day)\n"
-                response += "   Avoid excessive exercise to protect growing joints\n"
-            elif any(term in age.lower() for term in ['senior', 'old']):
-                response += f"1. {pet_name} is a senior - gentle, low-impact exercise (20-30 min/day)\n"
-                response += "   Swimming and short walks are ideal\n"
-            else:
-                response += "1. Daily walks (30-60 minutes depending on breed and size)\n"
+    # Weight-specific advice
+    ctx["weight_line"] = _NUTRITION_WEIGHT.format_map(ctx) if req.weight else _NUTRITION_WEIGHT_UNKNOWN
+    
+    # Activity level-based portion advice
+    if req.activity:
+        if req.activity_lower in _HIGH_ACTIVITY:
+            activity_line = _NUTRITION_ACTIVITY_HIGH
+        elif req.activity_lower in _LOW_ACTIVITY:
+            activity_line = _NUTRITION_ACTIVITY_LOW
         else:
-            response += "1. Daily walks (30-60 minutes depending on breed and age)\n"
-        
-        response += "2. Interactive playtime and games (fetch, tug-of-war)\n"
-        response += "3. Mental stimulation through training or puzzle toys\n"
-        
-        # Activity level adjustment
-        if activity:
-            response += f"4. Adjust intensity based on {pet_name}'s {activity.lower()} activity level\n"
+            activity_line = _NUTRITION_ACTIVITY_OTHER
+        ctx["activity_line"] = activity_line.format_map(ctx)
+    
+    # Medical conditions affecting diet
+    if req.medical_conditions:
+        diet_conditions = [mc for mc in req.medical_conditions if _DIET_CONDITIONS_RE.search(mc)]
+        if diet_conditions:
+            ctx["conditions"] = ', '.join(diet_conditions)
+            ctx["conditions_block"] = _NUTRITION_CONDITIONS.format_map(ctx)
+    
+    return _NUTRITION_TEMPLATE.format_map(ctx)
+
+def _faq_exercise(req: ParsedRequest) -> str:
+    ctx = {
+        "pet_name": req.pet_name,
+        "activity": req.activity_lower,
+        "breed_block": _breed_block(_EXERCISE_BREED, req.breed_lower, "exercise"),
+        "conditions_block": "",
+    }
+    
+    # Age-based exercise
+    if req.age:
+        if any(term in req.age_lower for term in _EXERCISE_PUPPY_TERMS):
+            age_line = _EXERCISE_AGE_PUPPY
+        elif any(term in req.age_lower for term in _EXERCISE_SENIOR_TERMS):
+            age_line = _EXERCISE_AGE_SENIOR
         else:
-            response += "4. Adjust activity based on weather and your dog's activity level\n"
-        
-        response += "5. Watch for signs of fatigue, overheating, or limping\n"
-        
-        # Medical condition considerations
-        if medical_conditions:
-            exercise_conditions = [mc for mc in medical_conditions if any(term in mc.lower() for term in ['joint', 'hip', 'arthritis', 'heart', 'respiratory'])]
-            if exercise_conditions:
-                response += f"\n⚠️ Exercise restrictions: {pet_name} has {', '.join(exercise_conditions)}. "
-                response += "Consult your veterinarian for appropriate exercise guidelines.\n"
-        
-        return response + context_note
+            age_line = _EXERCISE_AGE_ADULT
+    else:
+        age_line = _EXERCISE_AGE_UNKNOWN
+    ctx["age_line"] = age_line.format_map(ctx)
     
-    # Behavior questions
-    if any(word in question_lower for word in ['behavior', 'behave', 'training', 'train', 'obey', 'discipline']):
-        response = f"Behavior and training tips for {pet_name}:\n\n"
-        
-        # Breed-specific behavior notes
-        if breed and breed.lower() not in ['unknown', 'unknown breed', '']:
-            if any(b in breed.lower() for b in ['husky', 'malamute', 'shiba']):
-                response += f"🔸 {breed} breeds can be independent - be patient and consistent\n"
-            elif any(b in breed.lower() for b in ['border collie', 'australian shepherd', 'german shepherd']):
-                response += f"🔸 {breed} breeds are highly intelligent - provide mental challenges\n"
-            elif any(b in breed.lower() for b in ['retriever', 'labrador', 'golden']):
-                response += f"🔸 {breed} breeds respond well to positive reinforcement and treats\n"
-        
-        response += "General Training Guidelines:\n"
-        response += "1. Use positive reinforcement (treats, praise) - works best for all dogs\n"
-        response += "2. Be consistent with commands and rules across all family members\n"
-        response += "3. Socialize early and regularly (especially important for puppies)\n"
-        response += "4. Provide mental stimulation to prevent boredom and destructive behavior\n"
-        response += "5. Consider professional training classes if needed\n"
-        response += "6. Keep training sessions short (5-15 minutes) and fun\n"
-        response += "\n💡 Remember: Patience and consistency are key to successful training!"
-        return response + context_note
-    
-    # General care/grooming - highly personalized
-    if any(word in question_lower for word in ['care', 'grooming', 'bath', 'clean', 'brush', 'nail']):
-        response = f"General care tips for {pet_name}:\n\n"
-        
-        # Add breed-specific grooming advice
-        breed_grooming = get_breed_specific_advice(breed, "grooming")
-        if breed_grooming:
-            response += f"🔸 Breed-specific grooming: {breed_grooming}\n\n"
-        
-        response += "General Care Checklist:\n"
-        response += "1. Regular grooming based on coat type (weekly to daily brushing)\n"
-        response += "2. Brush teeth regularly (daily ideal, minimum 2-3 times/week) to prevent dental issues\n"
-        response += "3. Trim nails when they click on the floor (every 2-4 weeks typically)\n"
-        response += "4. Check ears weekly for signs of infection (redness, odor, discharge)\n"
-        response += "5. Keep living area clean and comfortable\n"
-        response += "6. Provide a safe, secure environment\n"
-        response += "7. Regular baths (monthly or as needed based on activity and coat type)\n"
-        
-        return response + context_note
+    # Activity level adjustment
+    ctx["activity_line"] = _EXERCISE_ACTIVITY.format_map(ctx) if req.activity else _EXERCISE_ACTIVITY_UNKNOWN
     
-    # If no match found, return None to proceed to OpenAI
-    return None
+    # Medical condition considerations
+    if req.medical_conditions:
+        exercise_conditions = [mc for mc in req.medical_conditions if _EXERCISE_CONDITIONS_RE.search(mc)]
+        if exercise_conditions:
+            ctx["conditions"] = ', '.join(exercise_conditions)
+            ctx["conditions_block"] = _EXERCISE_CONDITIONS.format_map(ctx)
+    
+    return _EXERCISE_TEMPLATE.format_map(ctx)
 
-def generate_dynamic_answer(question: str, history: list, location: Optional[str], pet_profile: dict, image_analysis_context: Optional[dict] = None) -> str:
-    """
-    Generates an AI response using OpenAI based on the question and pet profile.
-    First checks FAQ, then uses OpenAI if no match found.
-    """
-    # Step 1: Check FAQ first
-    faq_response = check_faq_match(question, pet_profile)
-    if faq_response:
-        print(f"FAQ match found for question: {question[:50]}...")
-        return faq_response
+def _faq_behavior(req: ParsedRequest) -> str:
+    ctx = {"pet_name": req.pet_name, "breed": req.breed, "breed_block": ""}
     
-    # Step 2: If no FAQ match and OpenAI client is not available, use fallback
-    if client is None:
-        print(f"No FAQ match and OpenAI not available, using fallback response")
-        return generate_fallback_response(question, pet_profile)
+    # Breed-specific behavior notes
+    breed_lower = req.breed_lower
+    if req.breed and breed_lower not in _UNKNOWN_BREEDS:
+        if any(b in breed_lower for b in _INDEPENDENT_BREEDS):
+            ctx["breed_block"] = _BEHAVIOR_INDEPENDENT.format_map(ctx)
+        elif any(b in breed_lower for b in _HERDING_BREEDS):
+            ctx["breed_block"] = _BEHAVIOR_HERDING.format_map(ctx)
+        elif any(b in breed_lower for b in _RETRIEVER_BREEDS):
+            ctx["breed_block"] = _BEHAVIOR_RETRIEVER.format_map(ctx)
+    
+    return _BEHAVIOR_TEMPLATE.format_map(ctx)
+
+def _faq_care(req: ParsedRequest) -> str:
+    return _CARE_TEMPLATE.format_map({
+        "pet_name": req.pet_name,
+        "breed_block": _breed_block(_CARE_BREED, req.breed_lower, "grooming"),
+    })
+
+# Response builder per category id, in _FAQ_KEYWORDS order
+_RESPONSE_BUILDERS: dict[int, Callable[[ParsedRequest], str]] = {
+    0: _faq_greeting,
+    1: _faq_health,
+    2: _faq_nutrition,
+    3: _faq_exercise,
+    4: _faq_behavior,
+    5: _faq_care,
+}
+
+def _pet_context_note(req: ParsedRequest) -> str:
+    """Profile summary appended to personalized FAQ answers"""
+    breed = req.breed
+    context_parts = []
+    if breed and req.breed_lower not in _UNKNOWN_BREEDS:
+        context_parts.append(f"Breed: {breed}")
+    if req.age:
+        context_parts.append(f"Age: {req.age}")
+    if req.weight:
+        context_parts.append(f"Weight: {req.weight}")
+    if req.gender:
+        context_parts.append(f"Gender: {req.gender}")
+    if req.medical_conditions:
+        context_parts.append(f"Medical Conditions: {', '.join(req.medical_conditions)}")
+    if not context_parts:
+        return ""
+    return f"\n\n*Based on {req.pet_name}'s profile: {' | '.join(context_parts)}*"
+
+# Rendered FAQ answers keyed by (category id, profile fields); answers are
+# fully determined by these, so repeat questions from a pet skip the builders
+_faq_render_cache = LRUCache(maxsize=4096)
+_faq_render_lock = threading.Lock()
+
+def _render_faq(category_id: int, req: ParsedRequest) -> str:
+    response = _RESPONSE_BUILDERS[category_id](req)
+    if category_id == _FAQ_GREETING_ID:
+        return response
+    return response + _pet_context_note(req)
+
+def _faq_answer(req: ParsedRequest) -> Optional[str]:
+    category_id = _match_faq_category(req.question_lower)
+    if category_id is None:
+        # If no match found, return None to proceed to OpenAI
+        return None
     
-    # Step 3: Use OpenAI for complex questions not in FAQ
     try:
-        # Build context from pet profile
-        profile_context = ""
-        if pet_profile:
-            profile_context = f"""
-Pet Profile:
-- Name: {pet_profile.get('petName', 'Unknown')}
-- Breed: {pet_profile.get('breed', 'Unknown')}
-- Age: {pet_profile.get('age', 'Unknown')}
-- Weight: {pet_profile.get('weight', 'Unknown')}
-- Gender: {pet_profile.get('gender', 'Unknown')}
-- Activity Level: {pet_profile.get('activityLevel', 'Unknown')}
-- Medical Conditions: {', '.join(pet_profile.get('medicalConditions', []))}
-- Goals: {', '.join(pet_profile.get('goals', []))}
-"""
-        
-        location_context = f"\nLocation: {location}" if location else ""
-        
-        # Add image analysis context if available
-        image_context = ""
-        if image_analysis_context:
-            image_context = f"""
-Recent Image Analysis:
-- Overall Health: {image_analysis_context.get('overall_health', 'Unknown')}
-- Body Condition: {image_analysis_context.get('body_condition', 'Unknown')}
-- Coat Condition: {image_analysis_context.get('coat_condition', 'Unknown')}
-- Eye Condition: {image_analysis_context.get('eye_condition', 'Unknown')}
-- Energy Level: {image_analysis_context.get('energy_level', 'Unknown')}
-- Observations: {', '.join(image_analysis_context.get('observations', [])) if isinstance(image_analysis_context.get('observations'), list) else str(image_analysis_context.get('observations', ''))}
-- Concerns: {', '.join(image_analysis_context.get('concerns', [])) if isinstance(image_analysis_context.get('concerns'), list) else ''}
-- Recommendations: {', '.join(image_analysis_context.get('recommendations', [])) if isinstance(image_analysis_context.get('recommendations'), list) else ''}
-"""
-            if image_analysis_context.get('vision_analysis'):
-                image_context += f"\nDetailed Vision Analysis: {image_analysis_context.get('vision_analysis')}\n"
-        
-        system_prompt = f"""You are a Dog Health & Nutrition AI Assistant.
+        key = (
+            category_id, req.pet_name, req.breed, req.weight, req.age,
+            req.gender, req.activity, tuple(req.medical_conditions or ()),
+        )
+        with _faq_render_lock:
+            cached = _faq_render_cache.get(key)
+    except TypeError:
+        # Unhashable profile values; render without caching
+        return _render_faq(category_id, req)
+    if cached is not None:
+        return cached
+    
+    response = _render_faq(category_id, req)
+    with _faq_render_lock:
+        _faq_render_cache[key] = response
+    return response
+
+def check_faq_match(question: str, pet_profile: dict) -> Optional[str]:
+    """
+    Check if the question matches common FAQ patterns and return personalized response.
+    Uses pet profile data and breed-specific advice when available.
+    Returns None if no match found, otherwise returns the response.
+    """
+    if not question or question.isspace():
+        return None
+    return _faq_answer(_parse(question, pet_profile))
+
+# Kept free of interpolation so it is byte-identical across requests
+# (OpenAI prompt caching keys on the exact prefix)
+STATIC_SYSTEM_PROMPT = """You are a Dog Health & Nutrition AI Assistant.
 
 STRICT RULES:
 1. Response style:
@@ -432,86 +713,385 @@ STRICT RULES:
    - Add advisory language when needed (e.g., "consult a vet if...")
 2. If the question is outside your knowledge, politely say you don't have that information.
 
+Provide helpful, accurate, and caring responses about dog health and wellness.
+When image analysis is provided (in the next message), incorporate those observations into your response."""
+
+def _freeze(mapping: dict) -> tuple:
+    """Canonical hashable form of a profile/analysis dict (lists become tuples)"""
+    return tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in mapping.items()))
+
+def _cached_context(builder, key: tuple) -> str:
+    """Call a memoized context builder, bypassing the cache for unhashable values"""
+    try:
+        return builder(key)
+    except TypeError:
+        return builder.__wrapped__(key)
+
+def _profile_signature(pet_profile: dict) -> tuple:
+    """Only the fields shown in the OpenAI profile block, so edits to other fields keep the cache warm"""
+    medical_conditions = pet_profile.get('medicalConditions', [])
+    goals = pet_profile.get('goals', [])
+    return (
+        pet_profile.get('petName', 'Unknown'),
+        pet_profile.get('breed', 'Unknown'),
+        pet_profile.get('age', 'Unknown'),
+        pet_profile.get('weight', 'Unknown'),
+        pet_profile.get('gender', 'Unknown'),
+        pet_profile.get('activityLevel', 'Unknown'),
+        tuple(medical_conditions) if isinstance(medical_conditions, list) else medical_conditions,
+        tuple(goals) if isinstance(goals, list) else goals,
+    )
+
+@lru_cache(maxsize=1024)
+def _render_profile_context(profile_sig: tuple) -> str:
+    name, breed, age, weight, gender, activity, medical_conditions, goals = profile_sig
+    return f"""
 Pet Profile:
-{profile_context}{location_context}{image_context}
+- Name: {name}
+- Breed: {breed}
+- Age: {age}
+- Weight: {weight}
+- Gender: {gender}
+- Activity Level: {activity}
+- Medical Conditions: {', '.join(medical_conditions)}
+- Goals: {', '.join(goals)}
+"""
 
-Provide helpful, accurate, and caring responses about dog health and wellness.
-When image analysis is provided, incorporate those observations into your response."""
+def _join_list(value, default: str) -> str:
+    """Comma-join a (frozen) list field, or return default for any other value"""
+    return ', '.join(value) if isinstance(value, tuple) else default
 
-        messages = [
-            {"role": "system", "content": system_prompt}
-        ]
-        
-        # Add history if available
-        for msg in history[-5:]:  # Last 5 messages for context
-            messages.append({"role": "user", "content": msg.get("question", "")})
-            messages.append({"role": "assistant", "content": msg.get("answer", "")})
-        
-        # Add current question
-        messages.append({"role": "user", "content": question})
-        
-        response = client.chat.completions.create(
+@lru_cache(maxsize=1024)
+def _build_image_context(frozen_analysis: tuple) -> str:
+    image_analysis_context = dict(frozen_analysis)
+    observations = image_analysis_context.get('observations', '')
+    observations = _join_list(observations, str(observations))
+    concerns = _join_list(image_analysis_context.get('concerns'), '')
+    recommendations = _join_list(image_analysis_context.get('recommendations'), '')
+    vision_analysis = image_analysis_context.get('vision_analysis')
+    vision_block = f"\nDetailed Vision Analysis: {vision_analysis}\n" if vision_analysis else ""
+    return f"""
+Recent Image Analysis:
+- Overall Health: {image_analysis_context.get('overall_health', 'Unknown')}
+- Body Condition: {image_analysis_context.get('body_condition', 'Unknown')}
+- Coat Condition: {image_analysis_context.get('coat_condition', 'Unknown')}
+- Eye Condition: {image_analysis_context.get('eye_condition', 'Unknown')}
+- Energy Level: {image_analysis_context.get('energy_level', 'Unknown')}
+- Observations: {observations}
+- Concerns: {concerns}
+- Recommendations: {recommendations}
+{vision_block}"""
+
+def _history_messages(history: list) -> list:
+    """User/assistant message pairs for the last 5 exchanges"""
+    return [
+        {"role": role, "content": content}
+        for msg in _recent_turns(history)
+        for role, content in (("user", msg.get("question", "")), ("assistant", msg.get("answer", "")))
+    ]
+
+def _build_chat_messages(
+    req: ParsedRequest,
+    history: list,
+    location: Optional[str],
+    image_analysis_context: Optional[dict]
+) -> list:
+    """Chat-completion messages for generate_dynamic_answer and its streaming variant"""
+    # Build context from pet profile
+    profile_context = _profile_context(req)
+    
+    location_context = f"\nLocation: {location}" if location else ""
+    
+    # Add image analysis context if available
+    image_context = _cached_context(_build_image_context, _freeze(image_analysis_context)) if image_analysis_context else ""
+    
+    # Static instructions first so they form an identical, cacheable prompt prefix;
+    # per-request context follows in its own system message
+    messages = [
+        {"role": "system", "content": STATIC_SYSTEM_PROMPT},
+        {"role": "system", "content": f"Pet Profile:\n{profile_context}{location_context}{image_context}"},
+    ]
+    
+    # Add history if available
+    messages.extend(_history_messages(history))
+    
+    # Add current question
+    messages.append({"role": "user", "content": req.question})
+    return messages
+
+def _openai_error_answer(e: Exception, req: ParsedRequest) -> str:
+    """User-facing reply for a failed OpenAI call"""
+    error_str = str(e)
+    logger.error("Error generating AI response: %s", e)
+    
+    # Check for specific error types
+    if "insufficient_quota" in error_str or "429" in error_str:
+        return "⚠️ Your OpenAI API quota has been exceeded. Please add credits to your OpenAI account at https://platform.openai.com/account/billing. Until then, I'll provide helpful responses based on your pet's profile."
+    elif "invalid_api_key" in error_str or "401" in error_str:
+        return "⚠️ OpenAI API key is invalid. Please check your API key in the .env file."
+    else:
+        # Fallback to intelligent responses when API fails
+        return _fallback_answer(req)
+
+async def _cache_answer(question: str, cache_key: bytes, context_key: bytes, answer: str) -> None:
+    _set_cached_response(cache_key, answer)
+    await asyncio.to_thread(response_disk_cache.store, cache_key, answer)
+    await asyncio.to_thread(semantic_cache.store, question, context_key, answer)
+
+async def _answer_without_openai(
+    req: ParsedRequest,
+    history: list,
+    location: Optional[str],
+    image_analysis_context: Optional[dict]
+) -> tuple:
+    """
+    Steps 1-3 of generate_dynamic_answer: FAQ, offline fallback, then the answer caches.
+    Returns (answer_or_None, cache_key, context_key).
+    """
+    # Step 1: Check FAQ first
+    faq_response = _faq_answer(req)
+    if faq_response:
+        logger.debug("FAQ match found for question: %s...", req.question[:50])
+        return faq_response, None, None
+    
+    # Step 2: If no FAQ match and OpenAI client is not available, use fallback
+    if _get_async_client() is None:
+        logger.debug("No FAQ match and OpenAI not available, using fallback response")
+        return _default_answer(req), None, None
+    
+    # Step 3: Reuse a recent answer for an identical (or paraphrased) request
+    context_key = _context_cache_key(history, location, req.pet_profile, image_analysis_context)
+    cached_answer, cache_key = await _cached_answer(req.question, context_key)
+    return cached_answer, cache_key, context_key
+
+async def _cached_answer(question: str, context_key: bytes) -> tuple:
+    """Exact-match caches (memory, then disk) first, then a paraphrase from the semantic cache. Returns (answer_or_None, cache_key)."""
+    cache_key = _response_cache_key(question, context_key)
+    cached_answer = _get_cached_response(cache_key)
+    if cached_answer is None:
+        cached_answer = await asyncio.to_thread(response_disk_cache.lookup, cache_key)
+        if cached_answer is not None:
+            # Warm the memory cache so the next hit skips the disk read
+            _set_cached_response(cache_key, cached_answer)
+    if cached_answer is None:
+        cached_answer = await asyncio.to_thread(semantic_cache.lookup, question, context_key)
+    return cached_answer, cache_key
+
+async def _openai_dynamic_answer(
+    req: ParsedRequest,
+    history: list,
+    location: Optional[str],
+    image_analysis_context: Optional[dict],
+    cache_key: bytes,
+    context_key: bytes
+) -> str:
+    """OpenAI call for generate_dynamic_answer; caches successful answers and maps errors to fallbacks"""
+    try:
+        messages = _build_chat_messages(req, history, location, image_analysis_context)
+        response = await _get_async_client().chat.completions.create(
             model="gpt-3.5-turbo",
             messages=messages,
             temperature=0.7,
             max_tokens=500
         )
         
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        await _cache_answer(req.question, cache_key, context_key, answer)
+        return answer
         
     except Exception as e:
-        error_str = str(e)
-        print(f"Error generating AI response: {e}")
-        
-        # Check for specific error types
-        if "insufficient_quota" in error_str or "429" in error_str:
-            return "⚠️ Your OpenAI API quota has been exceeded. Please add credits to your OpenAI account at https://platform.openai.com/account/billing. Until then, I'll provide helpful responses based on your pet's profile."
-        elif "invalid_api_key" in error_str or "401" in error_str:
-            return "⚠️ OpenAI API key is invalid. Please check your API key in the .env file."
-        else:
-            # Fallback to intelligent responses when API fails
-            return generate_fallback_response(question, pet_profile)
+        return _openai_error_answer(e, req)
+
+
+async def _await_inflight(inflight: asyncio.Future) -> Optional[str]:
+    """
+    Answer of an identical in-flight request, or None if that request was cancelled
+    before it finished (the caller then asks OpenAI itself)
+    """
+    try:
+        return await asyncio.shield(inflight)
+    except asyncio.CancelledError:
+        # Re-raise when this task is the one being cancelled (cancelling() is 3.11+)
+        task = asyncio.current_task()
+        if not inflight.cancelled() or (hasattr(task, "cancelling") and task.cancelling()):
+            raise
+        return None
+
+async def generate_dynamic_answer(question: str, history: list, location: Optional[str], pet_profile: dict, image_analysis_context: Optional[dict] = None) -> str:
+    """
+    Generates an AI response using OpenAI based on the question and pet profile.
+    First checks FAQ, then uses OpenAI if no match found.
+    """
+    # Empty pings and "..." never need FAQ matching or an API call
+    if _is_trivial_question(question):
+        return EMPTY_QUESTION_REPLY
+    # Normalize the question and profile once for every step below
+    req = _parse(question, pet_profile)
+    answer, cache_key, context_key = await _answer_without_openai(
+        req, history, location, image_analysis_context
+    )
+    if answer is not None:
+        return answer
+    
+    # Step 4: Use OpenAI for complex questions not in FAQ, sharing the call
+    # with any identical request already in flight
+    while (inflight := _inflight_requests.get(cache_key)) is not None:
+        answer = await _await_inflight(inflight)
+        if answer is not None:
+            return answer
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight_requests[cache_key] = future
+    try:
+        answer = await _openai_dynamic_answer(
+            req, history, location, image_analysis_context, cache_key, context_key
+        )
+        future.set_result(answer)
+        return answer
+    finally:
+        del _inflight_requests[cache_key]
+        if not future.done():
+            future.cancel()
+
 
+async def _stream_openai(messages: list, req: ParsedRequest, parts: list):
+    """
+    Yield completion deltas as they arrive, collecting them into parts.
+    On failure parts is cleared (nothing to cache) and, if nothing was sent yet,
+    the usual error/fallback reply is yielded instead.
+    """
+    try:
+        stream = await _get_async_client().chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            stream=True
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        if parts:
+            # Part of the answer is already on the wire; don't append a second reply
+            logger.error("Error streaming AI response: %s", e)
+            parts.clear()
+        else:
+            yield _openai_error_answer(e, req)
 
-def generate_dynamic_answer_with_faq_context(
+async def generate_dynamic_answer_stream(
     question: str,
     history: list,
     location: Optional[str],
     pet_profile: dict,
-    faq_context: str = ""
-) -> str:
+    image_analysis_context: Optional[dict] = None
+):
     """
-    Generates an AI response using OpenAI with FAQ context.
-    Used when FAQ match is weak or when GPT fallback is needed.
+    Streaming variant of generate_dynamic_answer: yields the answer as text chunks.
+    FAQ, fallback and cached answers arrive as a single chunk; OpenAI answers are
+    streamed token by token and cached once complete.
     """
-    # Step 1: If no OpenAI client, use fallback
-    if client is None:
-        print(f"No OpenAI client available, using fallback response")
-        return generate_fallback_response(question, pet_profile)
+    # Empty pings and "..." never need FAQ matching or an API call
+    if _is_trivial_question(question):
+        yield EMPTY_QUESTION_REPLY
+        return
+    # Normalize the question and profile once for every step below
+    req = _parse(question, pet_profile)
+    answer, cache_key, context_key = await _answer_without_openai(
+        req, history, location, image_analysis_context
+    )
+    if answer is not None:
+        yield answer
+        return
+    
+    # An identical request is already in flight; wait for its full answer
+    while (inflight := _inflight_requests.get(cache_key)) is not None:
+        answer = await _await_inflight(inflight)
+        if answer is not None:
+            yield answer
+            return
+    
+    parts = []
+    messages = _build_chat_messages(req, history, location, image_analysis_context)
+    async for delta in _stream_openai(messages, req, parts):
+        yield delta
     
-    # Step 2: Use OpenAI with FAQ context
+    if parts:
+        await _cache_answer(req.question, cache_key, context_key, "".join(parts))
+
+
+# Self-contained prompts (e.g. vet report analysis) go straight to OpenAI: the chat
+# pipeline's FAQ matcher would answer them from keywords in the prompt wording, and
+# the answer caches are keyed for pet-chat questions
+PROMPT_UNAVAILABLE_REPLY = "⚠️ AI analysis is unavailable right now. Please try again later."
+
+async def generate_prompt_answer(prompt: str) -> str:
+    """
+    Answer a self-contained prompt with OpenAI, skipping FAQ matching and the answer caches.
+    Raises RuntimeError if OpenAI isn't configured; API errors propagate to the caller.
+    """
+    client = _get_async_client()
+    if client is None:
+        raise RuntimeError("OpenAI API key not set.")
+    response = await client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.7,
+        max_tokens=500
+    )
+    return response.choices[0].message.content
+
+async def generate_prompt_answer_stream(prompt: str):
+    """
+    Streaming variant of generate_prompt_answer: yields the answer as text chunks.
+    If OpenAI is unavailable or fails before any text is sent, yields PROMPT_UNAVAILABLE_REPLY.
+    """
+    client = _get_async_client()
+    if client is None:
+        yield PROMPT_UNAVAILABLE_REPLY
+        return
+    sent = False
     try:
-        # Build context from pet profile
-        profile_context = ""
-        if pet_profile:
-            profile_context = f"""
-Pet Profile:
-- Name: {pet_profile.get('petName', 'Unknown')}
-- Breed: {pet_profile.get('breed', 'Unknown')}
-- Age: {pet_profile.get('age', 'Unknown')}
-- Weight: {pet_profile.get('weight', 'Unknown')}
-- Gender: {pet_profile.get('gender', 'Unknown')}
-- Activity Level: {pet_profile.get('activityLevel', 'Unknown')}
-- Medical Conditions: {', '.join(pet_profile.get('medicalConditions', []))}
-- Goals: {', '.join(pet_profile.get('goals', []))}
-"""
-        
-        location_context = f"\nLocation: {location}" if location else ""
-        
-        # Build system prompt with FAQ context
-        faq_context_section = f"\n\n{faq_context}" if faq_context else ""
-        
-        system_prompt = f"""You are a Dog Health & Nutrition AI Assistant that works ONLY with FAQ knowledge.
+        stream = await client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=500,
+            stream=True
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                sent = True
+                yield delta
+    except Exception as e:
+        logger.error("Error streaming AI response: %s", e)
+        if not sent:
+            yield PROMPT_UNAVAILABLE_REPLY
+
+
+def _build_faq_context_messages(
+    req: ParsedRequest,
+    history: list,
+    location: Optional[str],
+    faq_context: str
+) -> list:
+    """Chat-completion messages for the FAQ-grounded answer (buffered and streaming)"""
+    # Build context from pet profile
+    profile_context = _profile_context(req)
+    
+    location_context = f"\nLocation: {location}" if location else ""
+    
+    # Build system prompt with FAQ context
+    faq_context_section = f"\n\n{faq_context}" if faq_context else ""
+    
+    system_prompt = f"""You are a Dog Health & Nutrition AI Assistant that works ONLY with FAQ knowledge.
 
 STRICT RULES:
 1. Answer ONLY based on the FAQ context provided below. Do NOT hallucinate or add information outside the FAQ scope.
@@ -529,38 +1109,90 @@ FAQ Context:
 
 Pet Profile:
 {profile_context}{location_context}"""
-        
-        messages = [
-            {"role": "system", "content": system_prompt}
-        ]
-        
-        # Add history if available
-        for msg in history[-5:]:  # Last 5 messages for context
-            messages.append({"role": "user", "content": msg.get("question", "")})
-            messages.append({"role": "assistant", "content": msg.get("answer", "")})
-        
-        # Add current question
-        messages.append({"role": "user", "content": question})
-        
-        response = client.chat.completions.create(
+    
+    messages = [
+        {"role": "system", "content": system_prompt}
+    ]
+    
+    # Add history if available
+    messages.extend(_history_messages(history))
+    
+    # Add current question
+    messages.append({"role": "user", "content": req.question})
+    return messages
+
+async def generate_dynamic_answer_with_faq_context(
+    question: str,
+    history: list,
+    location: Optional[str],
+    pet_profile: dict,
+    faq_context: str = ""
+) -> str:
+    """
+    Generates an AI response using OpenAI with FAQ context.
+    Used when FAQ match is weak or when GPT fallback is needed.
+    """
+    req = _parse(question, pet_profile)
+    
+    # Step 1: If no OpenAI client, use fallback
+    client = _get_async_client()
+    if client is None:
+        logger.debug("No OpenAI client available, using fallback response")
+        return _fallback_answer(req)
+    
+    # Step 2: Reuse a recent answer to the same (or a paraphrased) question
+    context_key = _context_cache_key(history, location, req.pet_profile, None, faq_context)
+    cached_answer, cache_key = await _cached_answer(req.question, context_key)
+    if cached_answer is not None:
+        return cached_answer
+    
+    # Step 3: Use OpenAI with FAQ context
+    try:
+        messages = _build_faq_context_messages(req, history, location, faq_context)
+        response = await client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=messages,
             temperature=0.7,
             max_tokens=500
         )
         
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        await _cache_answer(req.question, cache_key, context_key, answer)
+        return answer
         
     except Exception as e:
-        error_str = str(e)
-        print(f"Error generating AI response with FAQ context: {e}")
-        
-        # Check for specific error types
-        if "insufficient_quota" in error_str or "429" in error_str:
-            return "⚠️ Your OpenAI API quota has been exceeded. Please add credits to your OpenAI account at https://platform.openai.com/account/billing. Until then, I'll provide helpful responses based on your pet's profile."
-        elif "invalid_api_key" in error_str or "401" in error_str:
-            return "⚠️ OpenAI API key is invalid. Please check your API key in the .env file."
-        else:
-            # Fallback to intelligent responses when API fails
-            return generate_fallback_response(question, pet_profile)
+        return _openai_error_answer(e, req)
+
 
+
+async def generate_dynamic_answer_with_faq_context_stream(
+    question: str,
+    history: list,
+    location: Optional[str],
+    pet_profile: dict,
+    faq_context: str = ""
+):
+    """
+    Streaming variant of generate_dynamic_answer_with_faq_context: yields the
+    answer as text chunks as OpenAI produces them.
+    """
+    req = _parse(question, pet_profile)
+    
+    # If no OpenAI client, use fallback
+    if _get_async_client() is None:
+        logger.debug("No OpenAI client available, using fallback response")
+        yield _fallback_answer(req)
+        return
+    
+    context_key = _context_cache_key(history, location, req.pet_profile, None, faq_context)
+    cached_answer, cache_key = await _cached_answer(req.question, context_key)
+    if cached_answer is not None:
+        yield cached_answer
+        return
+    
+    messages = _build_faq_context_messages(req, history, location, faq_context)
+    parts = []
+    async for delta in _stream_openai(messages, req, parts):
+        yield delta
+    if parts:
+        await _cache_answer(req.question, cache_key, context_key, "".join(parts))
@@ -1,24 +1,61 @@
-import requests
+import os
+import httpx
+from cachetools import TTLCache
+from dotenv import load_dotenv
 
-def enrich_with_location(location: str, query: str):
+load_dotenv()
+
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+WEATHER_API_URL = "http://api.openweathermap.org/data/2.5/weather"
+
+# OpenWeather refreshes roughly every 10 minutes, so a city's reading is reused that long
+_weather_cache = TTLCache(maxsize=1024, ttl=600)
+# One pooled keep-alive client so repeat lookups skip the TCP handshake; failed
+# connection attempts are retried, and the timeout stops a hung API stalling the chat
+_http = httpx.AsyncClient(
+    timeout=3.0,
+    transport=httpx.AsyncHTTPTransport(
+        retries=2,
+        limits=httpx.Limits(max_keepalive_connections=10, max_connections=50),
+    ),
+)
+
+async def _current_temperature(location: str):
+    """Current temperature (°C) for a city, or None if unknown / the API is unavailable"""
+    key = location.strip().lower()
+    if key in _weather_cache:
+        return _weather_cache[key]
+
+    temp = None
+    try:
+        response = await _http.get(
+            WEATHER_API_URL,
+            params={"q": location, "appid": OPENWEATHER_API_KEY, "units": "metric"},
+        )
+        data = response.json()
+        if "main" in data:
+            temp = data["main"]["temp"]
+    except (httpx.HTTPError, KeyError, ValueError):
+        return None  # not cached, so the next turn tries again
+
+    _weather_cache[key] = temp
+    return temp
+
+async def enrich_with_location(location: str, query: str):
     """
     Adds real-time location-based context.
     Example: weather, nearby vets, food availability.
     """
     advice = []
 
-    # Weather check
-    try:
-        weather_api = f"http://api.openweathermap.org/data/2.5/weather?q={location}&appid=YOUR_KEY&units=metric"
-        data = requests.get(weather_api).json()
-        if "main" in data:
-            temp = data["main"]["temp"]
+    # Weather check (skipped when no OpenWeather key is configured)
+    if OPENWEATHER_API_KEY:
+        temp = await _current_temperature(location)
+        if temp is not None:
             if temp > 30:
                 advice.append("It’s quite hot, ensure your dog stays hydrated and avoid long walks in the afternoon.")
             elif temp < 10:
                 advice.append("It’s cold, keep your dog warm and limit time outdoors.")
-    except:
-        pass
 
     # Vets / local services (dummy now, can extend with Google Maps API)
     advice.append(f"You can also check local vets near {location} for professional support.")
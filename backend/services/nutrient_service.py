@@ -1,5 +1,62 @@
 # services/nutrient_service.py
 
+import re
+import numpy as np
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick not installed; fall back to one combined regex
+    ahocorasick = None
+
+# MER multipliers by life stage
+AGE_FACTORS = {
+    "puppy": 3.0,       # up to 4 months
+    "young": 2.0,       # 4-12 months
+    "adult": 1.6,       # normal activity
+    "senior": 1.2,      # lower metabolism
+}
+# Extra MER multiplier by activity level (anything else: 1.0)
+ACTIVITY_MULTIPLIERS = {
+    "active": 1.8,
+    "working": 2.5,
+}
+
+# Array forms of the tables above for calculate_batch: age ids index AGE_STAGES,
+# activity ids index ACTIVITY_LEVELS
+AGE_STAGES = ("puppy", "young", "adult", "senior")
+ACTIVITY_LEVELS = ("normal", "active", "working")
+_AGE_FACTOR_ARRAY = np.array([AGE_FACTORS[stage] for stage in AGE_STAGES])
+_ACTIVITY_MULT_ARRAY = np.array([ACTIVITY_MULTIPLIERS.get(level, 1.0) for level in ACTIVITY_LEVELS])
+
+# Activity / diet keywords, found in one pass over the message; each maps to a tag
+_KEYWORD_TAGS = {
+    "active": "activity:active",
+    "work": "activity:working",
+    "vegetarian": "diet:vegetarian",
+    "non-veg": "diet:non-veg",
+    "meat": "diet:non-veg",
+}
+
+if ahocorasick is not None:
+    _KEYWORD_AUTOMATON = ahocorasick.Automaton()
+    for _word, _tag in _KEYWORD_TAGS.items():
+        _KEYWORD_AUTOMATON.add_word(_word, _tag)
+    _KEYWORD_AUTOMATON.make_automaton()
+    _KEYWORD_RE = None
+else:
+    # Zero-width lookahead at every position so overlapping keywords are all seen
+    _KEYWORD_AUTOMATON = None
+    _KEYWORD_RE = re.compile("(?=(" + "|".join(map(re.escape, _KEYWORD_TAGS)) + "))")
+
+def _keyword_tags(msg: str) -> set:
+    """Tags of every keyword occurring (as a substring) in the lowercased message"""
+    if _KEYWORD_AUTOMATON is not None:
+        return {tag for _, tag in _KEYWORD_AUTOMATON.iter(msg)}
+    return {_KEYWORD_TAGS[m.group(1)] for m in _KEYWORD_RE.finditer(msg)}
+
+# Weight ("20kg") and age ("5 years", "3 mo") in one pattern, so the message is scanned once
+_WEIGHT_AGE_RE = re.compile(r"(?P<weight>\d+)\s?kg|(?P<age>\d+)\s?(?P<unit>year|yr|years|yrs|month|mo)")
+
+
 def calculate_rer(weight_kg: float) -> float:
     """Resting Energy Requirement (RER) formula."""
     return 70 * (weight_kg ** 0.75)
@@ -7,22 +64,10 @@ def calculate_rer(weight_kg: float) -> float:
 
 def calculate_mer(rer: float, age_stage: str, activity_level: str) -> float:
     """Maintenance Energy Requirement (MER) depends on age + activity."""
-    factors = {
-        "puppy": 3.0,       # up to 4 months
-        "young": 2.0,       # 4-12 months
-        "adult": 1.6,       # normal activity
-        "senior": 1.2,      # lower metabolism
-    }
-
     # Adjust for activity
-    if activity_level == "active":
-        mult = 1.8
-    elif activity_level == "working":
-        mult = 2.5
-    else:
-        mult = 1.0
+    mult = ACTIVITY_MULTIPLIERS.get(activity_level, 1.0)
 
-    return rer * factors.get(age_stage, 1.6) * mult
+    return rer * AGE_FACTORS.get(age_stage, 1.6) * mult
 
 
 def calculate_macros(mer: float, weight_kg: float) -> dict:
@@ -38,6 +83,23 @@ def calculate_macros(mer: float, weight_kg: float) -> dict:
     }
 
 
+def calculate_batch(weights: np.ndarray, age_ids: np.ndarray, activity_ids: np.ndarray) -> dict:
+    """
+    Vectorized RER/MER/macros for many pets at once (bulk recomputes).
+    Same formulas as calculate_rer/calculate_mer/calculate_macros, unrounded.
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    rer = 70 * weights ** 0.75
+    mer = rer * _AGE_FACTOR_ARRAY[age_ids] * _ACTIVITY_MULT_ARRAY[activity_ids]
+    return {
+        "rer": rer,
+        "mer": mer,
+        "protein_g": 2.62 * weights,
+        "fat_g": 1.3 * weights,
+        "carbs_g": (mer * 0.3) / 4,
+    }
+
+
 def generate_tips(age_stage: str, mer: float, macros: dict, diet_type: str = "mixed") -> str:
     """Generate tailored nutrition tips based on calculation."""
     tips = []
@@ -72,39 +134,50 @@ def calculate_nutrients(user_msg: str) -> str:
     Parse basic info from user_msg and return nutrient recommendations.
     Example user_msg: "My 5 year old 20kg Labrador is active and vegetarian"
     """
-    import re
+    msg = user_msg.lower()
+
+    # First weight and first age mention, found in a single scan
+    weight_match = age_match = None
+    for match in _WEIGHT_AGE_RE.finditer(msg):
+        if match.group("weight") is not None:
+            weight_match = weight_match or match
+        else:
+            age_match = age_match or match
+        if weight_match and age_match:
+            break
 
     # --- Extract weight ---
-    weight_match = re.search(r"(\d+)\s?kg", user_msg.lower())
-    weight = float(weight_match.group(1)) if weight_match else 20.0  # default 20kg
+    weight = float(weight_match.group("weight")) if weight_match else 20.0  # default 20kg
 
     # --- Extract age ---
-    age_match = re.search(r"(\d+)\s?(year|yr|years|yrs|month|mo)", user_msg.lower())
     age_stage = "adult"
     if age_match:
-        val = int(age_match.group(1))
-        if "month" in age_match.group(2) and val <= 4:
+        val = int(age_match.group("age"))
+        unit = age_match.group("unit")
+        if "month" in unit and val <= 4:
             age_stage = "puppy"
-        elif "month" in age_match.group(2):
+        elif "month" in unit:
             age_stage = "young"
-        elif "year" in age_match.group(2) and val >= 7:
+        elif "year" in unit and val >= 7:
             age_stage = "senior"
         else:
             age_stage = "adult"
 
+    tags = _keyword_tags(msg)
+
     # --- Extract activity ---
-    if "active" in user_msg.lower():
+    if "activity:active" in tags:
         activity = "active"
-    elif "work" in user_msg.lower():
+    elif "activity:working" in tags:
         activity = "working"
     else:
         activity = "normal"
 
     # --- Extract diet type ---
     diet_type = "mixed"
-    if "vegetarian" in user_msg.lower():
+    if "diet:vegetarian" in tags:
         diet_type = "vegetarian"
-    elif "non-veg" in user_msg.lower() or "meat" in user_msg.lower():
+    elif "diet:non-veg" in tags:
         diet_type = "non-vegetarian"
 
     # --- Calculate ---
@@ -1,15 +1,32 @@
 # services/nutrition_service.py
 
-from openai import OpenAI
 from dotenv import load_dotenv
+from functools import lru_cache
 import os
+import asyncio
 import json
 from pydantic import BaseModel
 from typing import Optional
 
-# Setup OpenAI Client
-load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI clients are built (and the openai package imported) on first use,
+# so workers that never calculate nutrition don't pay for them
+@lru_cache(maxsize=1)
+def _get_client():
+    """Sync client, used for the Batch API helpers"""
+    from openai import OpenAI
+    load_dotenv()
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+@lru_cache(maxsize=1)
+def _get_async_client():
+    """Live calculations: the SDK retries rate limits, timeouts, connection errors and
+    5xx with exponential backoff + jitter, so transient failures don't reach the user"""
+    from openai import AsyncOpenAI
+    load_dotenv()
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=3, timeout=30.0)
+
+# Upper bound on concurrent live calculations (e.g. gather() over many profiles)
+NUTRITION_CONCURRENCY = asyncio.Semaphore(8)
 
 # Define a Pydantic model for the structured output from the AI
 class NutritionResult(BaseModel):
@@ -22,61 +39,139 @@ class NutritionResult(BaseModel):
     supplement_suggestions: str # Structured text from AI
     calculation_reference: str = "AAFCO/FEDIAF Standards (BalanceIT methodology)"
 
+def _strict_json_schema(model: type[BaseModel]) -> dict:
+    """JSON schema in the form OpenAI strict structured outputs accepts:
+    every property required, no extra properties, no defaults."""
+    schema = model.model_json_schema()
+    for prop in schema["properties"].values():
+        prop.pop("default", None)
+    schema["required"] = list(schema["properties"])
+    schema["additionalProperties"] = False
+    return schema
+
+# Built once; the model fills it directly instead of reading it from the prompt
+NUTRITION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "NutritionResult",
+        "schema": _strict_json_schema(NutritionResult),
+        "strict": True,
+    },
+}
+
+# Concise vet-nutritionist instructions; the output schema travels in response_format
+NUTRITION_SYSTEM_PROMPT = (
+    "You are a certified veterinary nutritionist. Calculate the dog's daily nutritional requirements "
+    "from its profile using the AAFCO Nutrient Profiles for Dogs (BalanceIT methodology):\n"
+    "1. RER = 70 * (weight in kg)^0.75.\n"
+    "2. MER = RER * a justified multiplier for age, activity level and goals.\n"
+    "3. Protein and fat grams from the MER, meeting AAFCO minimums for the life stage; "
+    "the remaining calories from safe carbohydrates.\n"
+    "4. 2-3 specific supplement recommendations with rationale, based on medical conditions, "
+    "age and goals (e.g. omega-3 ratios for coat health).\n"
+    "Reply with JSON matching the schema."
+)
+
+def _failed_result(error) -> NutritionResult:
+    """Safe fallback result structure returned when a calculation fails"""
+    return NutritionResult(
+        required_calories_kcal_day=0.0,
+        protein_grams_day=0.0,
+        fat_grams_day=0.0,
+        carbs_grams_day=0.0,
+        macro_distribution="Error: Failed to calculate.",
+        supplement_suggestions=f"Calculation service failed. Error: {error}",
+        calculation_reference="Service Failure"
+    )
+
+def _nutrition_request_body(pet_profile: dict) -> dict:
+    """Chat-completion parameters for one profile, shared by the live and batch paths"""
+    profile_summary = json.dumps(pet_profile, separators=(",", ":"))
+    user_prompt = f"Dog profile:\n{profile_summary}"
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": NUTRITION_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        # Structured output: the reply is guaranteed to match NutritionResult
+        "response_format": NUTRITION_RESPONSE_FORMAT,
+        "temperature": 0.7,
+    }
+
 async def calculate_and_suggest_nutrition(pet_profile: dict) -> NutritionResult:
     """
-    Uses GPT-4o-mini with structured JSON output to perform nutrition calculations 
+    Uses GPT-4o-mini with schema-enforced structured output to perform nutrition calculations 
     and suggest supplements based on AAFCO standards.
     """
-    json_schema = NutritionResult.model_json_schema()
-    profile_summary = json.dumps(pet_profile)
-    
-    # 🛑 Detailed system prompt for accurate, vet-like calculation
-    system_prompt = (
-        "You are an expert Certified Veterinary Nutritionist. Your primary reference for calculation "
-        "MUST be the **AAFCO Nutrient Profiles for Dogs** and general **Veterinary Nutrition guidelines** "
-        "(similar to BalanceIT methodology). Your task is to accurately calculate the dog's daily "
-        "nutritional requirements based on the provided profile. "
-        "**Calculation Steps MUST be based on industry standards:**\n"
-        "1. **RER (Resting Energy Requirement) Calculation:** RER = 70 * (Weight in kg)^0.75.\n"
-        "2. **MER (Maintenance Energy Requirement) Calculation:** Apply an appropriate, justified multiplier "
-        "to the RER based on age, activity level, and goals to determine the MER.\n"
-        "3. **Macronutrients:** Calculate protein and fat grams based on the resulting MER, ensuring the final "
-        "diet meets or exceeds AAFCO minimum percentages (based on the dog's life stage). The remainder of the MER should be attributed to safe carbohydrate sources.\n"
-        "4. **Supplementation:** Based on the profile (especially medical conditions, age, and goals), provide 2-3 specific, detailed supplement recommendations "
-        "with rationale (e.g., specific Omega-3 ratios for coat health). The recommendations must be objective and high-quality.\n"
-        "Your final response MUST be a JSON object that strictly adheres to the provided JSON schema."
-        f"SCHEMA: {json_schema}"
-    )
-    
-    user_prompt = f"Please calculate the full daily nutritional needs and suggest supplements for the dog with the following profile:\n\n{profile_summary}"
-
-    # Define the Structured Output Schema
-    
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            # Use response_format for guaranteed JSON output
-            response_format={"type": "json_object"},
-            temperature=0.7
-        )
+        async with NUTRITION_CONCURRENCY:
+            response = await _get_async_client().chat.completions.create(**_nutrition_request_body(pet_profile))
         
-        # Parse and return the result
-        result_dict = json.loads(response.choices[0].message.content)
-        return NutritionResult.model_validate(result_dict)
+        # Parse and validate the result in one step
+        return NutritionResult.model_validate_json(response.choices[0].message.content)
         
     except Exception as e:
         print(f"Nutrition AI calculation failed: {e}")
-        # Return a safe fallback result structure on failure
-        return NutritionResult(
-            required_calories_kcal_day=0.0,
-            protein_grams_day=0.0,
-            fat_grams_day=0.0,
-            carbs_grams_day=0.0,
-            macro_distribution="Error: Failed to calculate.",
-            supplement_suggestions=f"Calculation service failed. Error: {e}",
-            calculation_reference="Service Failure"
-        )
\ No newline at end of file
+        return _failed_result(e)
+
+# Batch API path for non-interactive recalculations (backfills, nightly jobs):
+# half the price and a separate rate-limit pool, results within 24h
+def submit_nutrition_batch(profiles: dict[str, dict]) -> str:
+    """
+    Submits one nutrition calculation per profile as an OpenAI batch.
+    `profiles` maps an id (e.g. pet_id) to its profile; returns the batch id.
+    """
+    client = _get_client()
+    lines = [
+        json.dumps({
+            "custom_id": str(custom_id),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": _nutrition_request_body(profile),
+        })
+        for custom_id, profile in profiles.items()
+    ]
+    batch_file = client.files.create(
+        file=("nutrition_batch.jsonl", "\n".join(lines).encode("utf-8")),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    return batch.id
+
+def poll_and_parse_batch(batch_id: str) -> Optional[dict[str, NutritionResult]]:
+    """
+    Returns {custom_id: NutritionResult} once the batch has completed, or None while
+    it is still running. Requests that failed get the usual fallback result.
+    """
+    client = _get_client()
+    batch = client.batches.retrieve(batch_id)
+    if batch.status in ("validating", "in_progress", "finalizing"):
+        return None
+    
+    results = {}
+    if batch.output_file_id:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line:
+                continue
+            item = json.loads(line)
+            try:
+                if item.get("error"):
+                    raise RuntimeError(item["error"].get("message", item["error"]))
+                content = item["response"]["body"]["choices"][0]["message"]["content"]
+                results[item["custom_id"]] = NutritionResult.model_validate_json(content)
+            except Exception as e:
+                print(f"Nutrition batch item {item.get('custom_id')} failed: {e}")
+                results[item["custom_id"]] = _failed_result(e)
+    if batch.error_file_id:
+        for line in client.files.content(batch.error_file_id).text.splitlines():
+            if line:
+                item = json.loads(line)
+                results.setdefault(item["custom_id"], _failed_result(item.get("error") or "batch request failed"))
+    if batch.status != "completed":
+        print(f"Nutrition batch {batch_id} ended with status {batch.status}")
+    return results
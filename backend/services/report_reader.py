@@ -1,37 +1,65 @@
 import io
-from PIL import Image
-from pdfminer.high_level import extract_text_to_fp
-from .llm_service import generate_dynamic_answer # Re-use your LLM service
-import pytesseract
+import os
+import shutil
+import asyncio
+from functools import lru_cache
+from .llm_service import generate_prompt_answer, generate_prompt_answer_stream # Re-use your LLM service
 
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# pdfminer, PIL and pytesseract are imported by the branch that needs them,
+# so workers that never read a report don't load them
 
-def analyze_health_report(file_data: bytes, file_mime_type: str) -> dict:
+@lru_cache(maxsize=1)
+def _pytesseract():
+    import pytesseract
+    # Resolved once: explicit setting, then PATH, then the default Windows install
+    pytesseract.pytesseract.tesseract_cmd = (
+        os.getenv("TESSERACT_CMD")
+        or shutil.which("tesseract")
+        or r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    )
+    return pytesseract
+
+# Only the start of a report reaches the LLM prompt, so don't extract more than that
+REPORT_TEXT_LIMIT = 4000
+PDF_MAX_PAGES = 5
+# Tesseract time grows faster than pixel count; phone photos of reports are far larger than needed
+OCR_MAX_SIZE = (1600, 1600)
+# LSTM engine, one uniform block of text: faster than full page segmentation (PSM 3) on report scans
+OCR_CONFIG = "--oem 1 --psm 6"
+
+def _ocr_sync(file_data: bytes) -> str:
+    """Decode, downscale and grayscale a report image, then OCR it (blocking; run in a thread)."""
+    from PIL import Image, ImageOps
+    img = Image.open(io.BytesIO(file_data))
+    img.thumbnail(OCR_MAX_SIZE)
+    img = ImageOps.autocontrast(img.convert("L"))
+    return _pytesseract().image_to_string(img, config=OCR_CONFIG)
+
+async def extract_report_text(file_data: bytes, file_mime_type: str) -> dict:
     """
-    Extracts text from a report file and uses the LLM to analyze it.
+    Extracts the text of a report file (PDF text layer or OCR for images).
+    Returns {"report_text": ...} or an {"error": ..., "detail": ...} dict.
     """
     report_text = ""
     
-    # --- 1. Extract Text from File ---
     if 'pdf' in file_mime_type:
         # Use pdfminer to extract text from the PDF byte stream
         try:
+            from pdfminer.high_level import extract_text_to_fp
             output = io.StringIO()
             with io.BytesIO(file_data) as pdf_file:
-                extract_text_to_fp(pdf_file, output)
-            report_text = output.getvalue()
+                extract_text_to_fp(pdf_file, output, maxpages=PDF_MAX_PAGES)
+            report_text = output.getvalue()[:REPORT_TEXT_LIMIT]
         except Exception as e:
             return {"error": "Failed to read PDF content.", "detail": str(e)}
 
     elif 'image' in file_mime_type:
         # Placeholder for OCR on images (Requires a library like pytesseract or cloud API)
         # For simplicity now, we'll ask the user to input text if image OCR fails.
+        pytesseract = _pytesseract()
         try:
-            # 1. Open the image bytes using PIL
-            img = Image.open(io.BytesIO(file_data))
-            
-            # 2. Use pytesseract to extract text (OCR)
-            report_text = pytesseract.image_to_string(img)
+            # Open, preprocess and OCR the image off the event loop
+            report_text = await asyncio.to_thread(_ocr_sync, file_data)
             
             if not report_text.strip():
                  return {"error": "OCR failed to find text in the image.", "detail": "Image may be too blurry or low resolution."}
@@ -46,27 +74,36 @@ def analyze_health_report(file_data: bytes, file_mime_type: str) -> dict:
 
     if not report_text.strip():
         return {"error": "Report is empty or text extraction failed.", "detail": "No text found."}
+    
+    return {"report_text": report_text}
 
-    # --- 2. LLM Analysis ---
-    # Construct a specific prompt to force the LLM to analyze the medical text
-    analysis_prompt = (
+def _analysis_prompt(report_text: str) -> str:
+    """Construct a specific prompt to force the LLM to analyze the medical text"""
+    return (
         f"You are a **Certified Veterinary Assistant AI**."
         f"Your task is to analyze the following vet or lab report text. "
         f"Follow these steps precisely:\n"
         f"1. **SUMMARY:** Provide a clear, concise summary of the major findings (diagnosis, key results, overall health). Be reassuring and professional.\n"
         f"2. **TIPS:** Based *only* on the report, provide 3-5 practical, easy-to-follow care tips, lifestyle changes, or next-step recommendations for the pet owner. Do not suggest diagnosis, only care/follow-up.\n"
         f"3. **Format:** Present your analysis using bold headings for the SUMMARY and TIPS sections.\n\n"
-        f"--- REPORT TEXT TO ANALYZE ---\n{report_text[:4000]}" # Limit text length for API
+        f"--- REPORT TEXT TO ANALYZE ---\n{report_text[:REPORT_TEXT_LIMIT]}" # Limit text length for API
     )
-    
+
+async def analyze_health_report(file_data: bytes, file_mime_type: str) -> dict:
+    """
+    Extracts text from a report file and uses the LLM to analyze it.
+    """
+    # --- 1. Extract Text from File ---
+    extracted = await extract_report_text(file_data, file_mime_type)
+    if "error" in extracted:
+        return extracted
+    report_text = extracted["report_text"]
+
+    # --- 2. LLM Analysis ---
     try:
-        # Use your existing LLM function but with a specialized analysis prompt
-        analysis_response = generate_dynamic_answer(
-            user_msg=analysis_prompt, 
-            history=[], 
-            location=None, 
-            pet_profile=None # No pet profile needed for raw analysis
-        )
+        # Straight to the model with the specialized analysis prompt (not the chat
+        # pipeline, whose FAQ matcher would answer from the prompt's wording)
+        analysis_response = await generate_prompt_answer(_analysis_prompt(report_text))
         
         return {
             "type": "report_analysis",
@@ -75,4 +112,12 @@ def analyze_health_report(file_data: bytes, file_mime_type: str) -> dict:
             "analysis_result": analysis_response
         }
     except Exception as e:
-        return {"error": "LLM analysis failed.", "detail": str(e)}
\ No newline at end of file
+        return {"error": "LLM analysis failed.", "detail": str(e)}
+
+def analyze_report_text_stream(report_text: str):
+    """
+    Streaming LLM analysis of already-extracted report text (see extract_report_text);
+    yields the answer as text chunks. Extraction/OCR can take seconds, so callers
+    should run it first and tell the user the report is being analyzed.
+    """
+    return generate_prompt_answer_stream(_analysis_prompt(report_text))
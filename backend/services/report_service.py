@@ -1,12 +1,8 @@
+import io
 import os
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
-from reportlab.platypus import Image as RLImage
-from reportlab.platypus import SimpleDocTemplate, Spacer
-from reportlab.lib.utils import ImageReader
-from typing import List, Dict
-from .storage import REPORT_DIR, register_report
+import asyncio
+from functools import lru_cache
+from typing import List, Dict, Optional, Union
 from fastapi import HTTPException
 from services.dog_detector import is_dog_image
 from services.breed_classifier import predict_breed
@@ -18,24 +14,63 @@ def _wrap_line(text: str, width: int) -> List[str]:
     """Word-wrap helper for long lines in PDF"""
     words = text.split()
     out, line = [], []
+    line_len = 0  # length of " ".join(line), kept as we go instead of re-joining
     for w in words:
-        if len(" ".join(line + [w])) > width:
+        if line_len + (1 if line else 0) + len(w) > width:
             out.append(" ".join(line))
             line = [w]
+            line_len = len(w)
         else:
+            line_len += (1 if line else 0) + len(w)
             line.append(w)
     if line:
         out.append(" ".join(line))
     return out
 
 
-def analyze_dog_image(image_path: str) -> dict:
-    # Step 1: Detect dog
-    if not is_dog_image(image_path):
-        raise HTTPException(status_code=400, detail="No dog detected in image")
+# Images are drawn at most 3 inches wide/high; 450px keeps them sharp at 150 DPI
+_PDF_IMAGE_MAX_PX = 450
+
 
-    # Step 2: Predict breed (now includes confidence)
-    breed, confidence = predict_breed(image_path)
+@lru_cache(maxsize=128)
+def _pdf_image(image_path: str, mtime: float):
+    """
+    Decoded, downscaled image (reportlab ImageReader) for embedding in a PDF, cached
+    per file version (mtime is part of the key) so repeated images aren't re-read or re-encoded.
+    """
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader
+
+    with Image.open(image_path) as img:
+        if max(img.size) <= _PDF_IMAGE_MAX_PX:
+            return ImageReader(image_path)
+        img.thumbnail((_PDF_IMAGE_MAX_PX, _PDF_IMAGE_MAX_PX), Image.LANCZOS)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=80)
+    buf.seek(0)
+    return ImageReader(buf)
+
+
+def _detect_and_classify(image_path: str):
+    """Decode the image once and run dog detection + breed prediction on it (blocking)."""
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+    is_dog = is_dog_image(img)[0]
+    if not is_dog:
+        return None
+    return predict_breed(img)
+
+
+async def analyze_dog_image(image_path: str) -> dict:
+    # Steps 1-2: Detect dog, then predict breed (now includes confidence), off the event loop
+    prediction = await asyncio.to_thread(_detect_and_classify, image_path)
+    if prediction is None:
+        raise HTTPException(status_code=400, detail="No dog detected in image")
+    breed, confidence = prediction
 
     # Step 3: Generate health report
     report = get_health_report(breed)
@@ -47,15 +82,22 @@ def analyze_dog_image(image_path: str) -> dict:
     }
 
 
-def create_session_report_pdf(session_id: str, data: Dict) -> str:
+def create_session_report_pdf(session_id: str, data: Dict, out: Optional[str] = None) -> Union[bytes, str]:
     """
     Generate a PDF report for a single session safely,
     handling different chat history formats.
+    Returns the PDF bytes (for streaming straight to the client), or writes it
+    to `out` and returns that path, e.g. os.path.join(REPORT_DIR, f"{session_id}.pdf").
     """
-    filename = f"{session_id}.pdf"
-    filepath = os.path.join(REPORT_DIR, filename)
+    # reportlab is only loaded when a report is actually generated
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.pdfgen import canvas
 
-    c = canvas.Canvas(filepath, pagesize=A4)
+    buf = io.BytesIO() if out is None else None
+
+    # pageCompression zlib-compresses the page content streams
+    c = canvas.Canvas(out if out is not None else buf, pagesize=A4, pageCompression=1)
     w, h = A4
     y = h - 72
 
@@ -81,7 +123,7 @@ def create_session_report_pdf(session_id: str, data: Dict) -> str:
             if image_path and os.path.exists(image_path):
                 try:
 
-                    img = ImageReader(image_path)
+                    img = _pdf_image(image_path, os.path.getmtime(image_path))
                     iw, ih = img.getSize()
                     max_width, max_height = 3*inch, 3*inch
                     scale = min(max_width/iw, max_height/ih, 1.0)
@@ -116,6 +158,11 @@ def create_session_report_pdf(session_id: str, data: Dict) -> str:
         c.drawString(72, y, "Chat History")
         y -= 20
 
+        # Current font / fill colour; state changes are only emitted when they differ.
+        # A new page starts from reportlab's defaults, so both are forgotten on showPage.
+        font = None
+        fill = None
+
         for item in chats:
             # Safely check if the item is a dictionary with role and text
             if not isinstance(item, dict) or 'role' not in item or 'text' not in item:
@@ -135,38 +182,47 @@ def create_session_report_pdf(session_id: str, data: Dict) -> str:
                 role_label = role_key.capitalize()
                 color_rgb = (0.3, 0.3, 0.3) # Gray
 
-            c.setFillColorRGB(*color_rgb) 
-            
             # Start line with bold role
             ln_prefix = f"[{role_label}]: "
             is_first_line = True
             
+            indent = " " * len(ln_prefix)
+            
             # Word wrap the content using the _wrap_line helper
             for wrap in _wrap_line(content, 90):
                 if y < 72:
                     c.showPage()
                     y = h - 72
+                    font = fill = None
+                if color_rgb != fill:
+                    c.setFillColorRGB(*color_rgb)
+                    fill = color_rgb
                 
                 # Draw the prefix only on the first line
                 full_line = ""
                 if is_first_line:
-                    c.setFont("Helvetica-Bold", 10)
+                    line_font = "Helvetica-Bold"
                     full_line = ln_prefix
                     is_first_line = False
                 else:
-                    c.setFont("Helvetica", 10)
-                    full_line = " " * len(ln_prefix)
+                    line_font = "Helvetica"
+                    full_line = indent
+                if line_font != font:
+                    c.setFont(line_font, 10)
+                    font = line_font
                         
                 c.drawString(72, y, full_line + wrap)
                 y -= 14
             
-            c.setFillColorRGB(0, 0, 0) # Reset color to black
             y -= 6 # Small space between messages
             
             if y < 72:
                 c.showPage()
                 y = h - 72
+                font = fill = None
+
+        c.setFillColorRGB(0, 0, 0) # Reset color to black
 
     c.showPage()
     c.save()
-    return filepath
+    return buf.getvalue() if out is None else out
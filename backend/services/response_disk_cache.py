@@ -0,0 +1,58 @@
+# response_disk_cache.py - Persistent cache of OpenAI chat answers
+"""
+Keeps exact-match OpenAI answers on disk so they survive server restarts and
+are shared between worker processes. Sits behind the in-memory TTL cache in
+llm_service and uses the same keys (digest of question + context).
+
+Enabled by setting LLM_DISK_CACHE_DIR to a writable directory. Entries expire
+after LLM_DISK_CACHE_TTL seconds (default one day); the cache is capped at
+LLM_DISK_CACHE_SIZE_MB and evicts least-recently-stored entries beyond that.
+"""
+
+import logging
+import os
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DISK_CACHE_DIR = os.getenv("LLM_DISK_CACHE_DIR", "")
+DISK_CACHE_TTL = int(os.getenv("LLM_DISK_CACHE_TTL", "86400"))
+DISK_CACHE_SIZE_MB = int(os.getenv("LLM_DISK_CACHE_SIZE_MB", "256"))
+# Bump when the model, sampling settings or prompts change so old answers aren't served
+_KEY_PREFIX = b"gpt-3.5-turbo|0.7|v1|"
+
+_lock = threading.Lock()
+_cache = None
+
+
+def _ensure_loaded():
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                import diskcache
+
+                _cache = diskcache.Cache(DISK_CACHE_DIR, size_limit=DISK_CACHE_SIZE_MB * 1024 * 1024)
+    return _cache
+
+
+def lookup(key: bytes) -> Optional[str]:
+    """Return the stored answer for a response-cache key, if any."""
+    if not DISK_CACHE_DIR:
+        return None
+    try:
+        return _ensure_loaded().get(_KEY_PREFIX + key)
+    except Exception as e:
+        logger.error("Disk cache lookup error: %s", e)
+    return None
+
+
+def store(key: bytes, answer: str) -> None:
+    """Persist an answer under a response-cache key."""
+    if not DISK_CACHE_DIR:
+        return
+    try:
+        _ensure_loaded().set(_KEY_PREFIX + key, answer, expire=DISK_CACHE_TTL)
+    except Exception as e:
+        logger.error("Disk cache store error: %s", e)
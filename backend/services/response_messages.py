@@ -1,31 +1,133 @@
 # response_messages.py - User-friendly, trust-building AI response messages with anti-repetition
 
-# Message type constants for tracking
-LOW_CONFIDENCE_WARNING = "LOW_CONFIDENCE_WARNING"
-MEDIUM_CONFIDENCE_GUIDANCE = "MEDIUM_CONFIDENCE_GUIDANCE"
-SUCCESS_CONFIRMATION = "SUCCESS_CONFIRMATION"
-NON_DOG_MESSAGE = "NON_DOG_MESSAGE"
+import re
+from enum import IntEnum
+from functools import lru_cache
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick not installed; fall back to one combined regex
+    ahocorasick = None
 
+# Message type constants for tracking (small ints: cheap to compare and hash)
+class MsgType(IntEnum):
+    LOW_CONFIDENCE_WARNING = 0
+    MEDIUM_CONFIDENCE_GUIDANCE = 1
+    SUCCESS_CONFIRMATION = 2
+    NON_DOG_MESSAGE = 3
 
-def _detect_message_type(text: str) -> str:
+
+LOW_CONFIDENCE_WARNING = MsgType.LOW_CONFIDENCE_WARNING
+MEDIUM_CONFIDENCE_GUIDANCE = MsgType.MEDIUM_CONFIDENCE_GUIDANCE
+SUCCESS_CONFIRMATION = MsgType.SUCCESS_CONFIRMATION
+NON_DOG_MESSAGE = MsgType.NON_DOG_MESSAGE
+
+# ImageNet synset id in front of a class label, e.g. "n02099712 Labrador_retriever"
+_IMAGENET_PREFIX_RE = re.compile(r"^n\d+ ")
+
+# Shared message text, defined once and reused by the get_*_message helpers
+_CLEAR_PHOTO_TIP = "👉 Please upload a clear photo where your dog's face or body is visible."
+_PARTIAL_VIEW_WARNING = (
+    "⚠️ I couldn't confidently analyze this image yet.\n\n"
+    "The photo appears to be a close-up or partial view, so I wasn't able to clearly recognize your dog.\n\n"
+    + _CLEAR_PHOTO_TIP
+)
+_MEDIUM_CONFIDENCE_GUIDANCE = (
+    "🐾 I can see something that might be your dog, but I need a clearer image to be sure.\n\n"
+    "For best results:\n"
+    "• Upload one clear photo of your dog\n"
+    "• Then upload a close-up of the specific area you're concerned about"
+)
+_STILL_NEED_PHOTO = "I still need one clear photo of your dog to continue the analysis."
+_NEED_CLEARER_PHOTO = "I need a clearer photo of your dog to continue."
+_UPLOAD_CLEAR_PHOTO = "Please upload a clear photo of your dog."
+_DOG_SEEN = "✅ I can see your dog!\n\n"
+
+# Escalating replies: (message type, variants). The first variant is shown the first
+# time, later ones as the same type repeats (the last one from then on).
+_ESCALATING_MESSAGES = {
+    "unclear_dog": (LOW_CONFIDENCE_WARNING, (
+        _PARTIAL_VIEW_WARNING,
+        _STILL_NEED_PHOTO,
+        _UPLOAD_CLEAR_PHOTO,
+    )),
+    "possible_dog": (MEDIUM_CONFIDENCE_GUIDANCE, (
+        _MEDIUM_CONFIDENCE_GUIDANCE,
+        _NEED_CLEARER_PHOTO,
+    )),
+    "unclear_breed": (LOW_CONFIDENCE_WARNING, (
+        _DOG_SEEN +
+        "However, I couldn't identify the breed with high confidence from this photo.\n\n"
+        "👉 Please upload a clearer photo where your dog's full body or face is visible.",
+        "I still need a clearer photo of your dog to identify the breed.",
+        _UPLOAD_CLEAR_PHOTO,
+    )),
+    "hairless_suspicion": (LOW_CONFIDENCE_WARNING, (
+        "⚠️ I couldn't confidently analyze this image yet.\n\n"
+        "The photo appears to be unclear or shows only a partial view.\n\n"
+        + _CLEAR_PHOTO_TIP,
+        _STILL_NEED_PHOTO,
+        _UPLOAD_CLEAR_PHOTO,
+    )),
+    "non_dog": (NON_DOG_MESSAGE, (
+        "I couldn't clearly recognize a dog in this image yet.\n\n"
+        "This tool works best with clear photos of dogs. Please upload a photo of your dog to continue.",
+        "I need a photo of your dog to continue. Please upload a clear photo of your dog.",
+        "Please upload a photo of your dog.",
+    )),
+}
+
+
+# Sentinel phrases per message type, in priority order (earlier groups win when
+# several match). NON_DOG's phrase also contains LOW_CONFIDENCE's, so it never wins.
+_MESSAGE_TYPE_PHRASES = (
+    (LOW_CONFIDENCE_WARNING, ("couldn't confidently analyze", "couldn't clearly recognize")),
+    (MEDIUM_CONFIDENCE_GUIDANCE, ("might need a clearer photo", "can see something that might be")),
+    (SUCCESS_CONFIRMATION, ("detected successfully", "breed identified")),
+    (NON_DOG_MESSAGE, ("couldn't clearly recognize a dog",)),
+)
+
+if ahocorasick is not None:
+    _MESSAGE_TYPE_AUTOMATON = ahocorasick.Automaton()
+    for _priority, (_, _phrases) in enumerate(_MESSAGE_TYPE_PHRASES):
+        for _phrase in _phrases:
+            _MESSAGE_TYPE_AUTOMATON.add_word(_phrase, _priority)
+    _MESSAGE_TYPE_AUTOMATON.make_automaton()
+    _MESSAGE_TYPE_RE = None
+else:
+    # Zero-width lookahead so overlapping phrases are all seen; group i+1 is priority i
+    _MESSAGE_TYPE_AUTOMATON = None
+    _MESSAGE_TYPE_RE = re.compile("(?=" + "|".join(
+        "(" + "|".join(map(re.escape, phrases)) + ")"
+        for _, phrases in _MESSAGE_TYPE_PHRASES
+    ) + ")")
+
+
+@lru_cache(maxsize=1024)
+def _detect_message_type(text: str) -> MsgType:
     """
     Detect message type from AI response text for repetition tracking.
+    One pass over the text finds every sentinel phrase; the highest-priority type wins.
+    Memoized: the same recent AI messages are re-checked on every upload.
     """
     text_lower = text.lower()
     
-    if "couldn't confidently analyze" in text_lower or "couldn't clearly recognize" in text_lower:
-        return LOW_CONFIDENCE_WARNING
-    elif "might need a clearer photo" in text_lower or "can see something that might be" in text_lower:
-        return MEDIUM_CONFIDENCE_GUIDANCE
-    elif "detected successfully" in text_lower or "breed identified" in text_lower:
-        return SUCCESS_CONFIRMATION
-    elif "couldn't clearly recognize a dog" in text_lower:
-        return NON_DOG_MESSAGE
+    if _MESSAGE_TYPE_AUTOMATON is not None:
+        matches = (priority for _, priority in _MESSAGE_TYPE_AUTOMATON.iter(text_lower))
     else:
+        matches = (m.lastindex - 1 for m in _MESSAGE_TYPE_RE.finditer(text_lower))
+    best = None
+    for priority in matches:
+        if best is None or priority < best:
+            best = priority
+            if best == 0:
+                break
+    
+    if best is None:
         return LOW_CONFIDENCE_WARNING  # Default
+    return _MESSAGE_TYPE_PHRASES[best][0]
 
 
-def _count_recent_message_type(messages: list, message_type: str, lookback: int = 3) -> int:
+def _count_recent_message_type(messages: list, message_type: MsgType, lookback: int = 3) -> int:
     """
     Count how many times the same message type appeared in recent AI messages.
     
@@ -40,24 +142,31 @@ def _count_recent_message_type(messages: list, message_type: str, lookback: int
     if not messages:
         return 0
     
-    # Get last N AI messages (reverse order, most recent first)
-    ai_messages = [msg for msg in messages if msg.get('sender') == 'ai' or 'ai' in str(msg.get('sender', '')).lower()][-lookback:]
-    
-    if not ai_messages:
-        return 0
-    
+    # Walk back from the most recent message over (at most) the last N AI messages;
+    # no need to filter the whole history first
     count = 0
-    # Count backwards from most recent
-    for msg in reversed(ai_messages):
+    for msg in reversed(messages):
+        sender = msg.get('sender', '')
+        # Fast path for the usual exact "ai" sender before the case-insensitive check
+        if sender != 'ai' and 'ai' not in str(sender).lower():
+            continue
         msg_text = msg.get('text', '') or ''
-        if _detect_message_type(msg_text) == message_type:
-            count += 1
-        else:
+        if _detect_message_type(msg_text) != message_type:
             break  # Stop counting if type changes
+        count += 1
+        if count == lookback:
+            break
     
     return count
 
 
+def _escalating_message(key: str, recent_messages: list) -> str:
+    """Pick the variant of an escalating reply based on how often its type was just sent."""
+    message_type, variants = _ESCALATING_MESSAGES[key]
+    repetition_count = _count_recent_message_type(recent_messages, message_type)
+    return variants[min(repetition_count, len(variants) - 1)]
+
+
 def get_dog_detection_message(dog_conf: float, recent_messages: list = None) -> str:
     """
     Generate user-friendly message based on dog detection confidence.
@@ -75,47 +184,18 @@ def get_dog_detection_message(dog_conf: float, recent_messages: list = None) ->
     
     # 🔴 Confidence < 30%: Very unclear image
     if dog_conf < 0.30:
-        message_type = LOW_CONFIDENCE_WARNING
-        repetition_count = _count_recent_message_type(recent_messages, message_type)
-        
-        if repetition_count == 0:
-            # First occurrence - full message
-            return (
-                "⚠️ I couldn't confidently analyze this image yet.\n\n"
-                "The photo appears to be a close-up or partial view, so I wasn't able to clearly recognize your dog.\n\n"
-                "👉 Please upload a clear photo where your dog's face or body is visible."
-            )
-        elif repetition_count == 1:
-            # Second occurrence - shorter
-            return (
-                "I still need one clear photo of your dog to continue the analysis."
-            )
-        else:
-            # Third+ occurrence - ultra-short
-            return "Please upload a clear photo of your dog."
+        # Full message first, then shorter, then ultra-short on repetition
+        return _escalating_message("unclear_dog", recent_messages)
     
     # 🟡 Confidence 30-60%: Possible dog but unclear
     elif dog_conf < 0.60:
-        message_type = MEDIUM_CONFIDENCE_GUIDANCE
-        repetition_count = _count_recent_message_type(recent_messages, message_type)
-        
-        if repetition_count == 0:
-            return (
-                "🐾 I can see something that might be your dog, but I need a clearer image to be sure.\n\n"
-                "For best results:\n"
-                "• Upload one clear photo of your dog\n"
-                "• Then upload a close-up of the specific area you're concerned about"
-            )
-        else:
-            # Shorter on repetition
-            return (
-                "I need a clearer photo of your dog to continue."
-            )
+        # Shorter on repetition
+        return _escalating_message("possible_dog", recent_messages)
     
     # 🟢 Confidence > 60%: Should not reach here (would proceed normally)
     else:
         return (
-            "✅ I can see your dog!\n\n"
+            _DOG_SEEN +
             "I'm processing the image now to identify the breed and provide insights."
         )
 
@@ -135,12 +215,8 @@ def get_breed_detection_message(breed: str, breed_conf: float, dog_conf: float =
         Friendly breed identification message
     """
     recent_messages = recent_messages or []
-    clean_breed = breed
-    if breed:
-        # Remove ImageNet class prefix if present
-        parts = breed.split(' ', 1)
-        if len(parts) > 1 and parts[0].startswith('n') and parts[0][1:].isdigit():
-            clean_breed = parts[1]
+    # Remove ImageNet class prefix if present
+    clean_breed = _IMAGENET_PREFIX_RE.sub('', breed, count=1) if breed else breed
     
     breed_pct = round(breed_conf * 100) if breed_conf > 0 else 0
     
@@ -154,25 +230,13 @@ def get_breed_detection_message(breed: str, breed_conf: float, dog_conf: float =
     # 🟡 Medium confidence - hide percentage, shorter message
     elif breed_pct >= 30:
         return (
-            "✅ I can see your dog!\n\n"
+            _DOG_SEEN +
             f"🐶 **Possible breed:** {clean_breed}\n\n"
             "For more accurate breed identification, try uploading a clearer photo where your dog's full body or face is visible."
         )
     # 🔴 Low confidence - no percentage, guidance message
     else:
-        message_type = LOW_CONFIDENCE_WARNING
-        repetition_count = _count_recent_message_type(recent_messages, message_type)
-        
-        if repetition_count == 0:
-            return (
-                "✅ I can see your dog!\n\n"
-                "However, I couldn't identify the breed with high confidence from this photo.\n\n"
-                "👉 Please upload a clearer photo where your dog's full body or face is visible."
-            )
-        elif repetition_count == 1:
-            return "I still need a clearer photo of your dog to identify the breed."
-        else:
-            return "Please upload a clear photo of your dog."
+        return _escalating_message("unclear_breed", recent_messages)
 
 
 def get_hairless_breed_suspicion_message(recent_messages: list = None) -> str:
@@ -180,20 +244,7 @@ def get_hairless_breed_suspicion_message(recent_messages: list = None) -> str:
     Message when hairless breed is detected but confidence is low (possible goat/sheep).
     Adaptive length based on repetition.
     """
-    recent_messages = recent_messages or []
-    message_type = LOW_CONFIDENCE_WARNING
-    repetition_count = _count_recent_message_type(recent_messages, message_type)
-    
-    if repetition_count == 0:
-        return (
-            "⚠️ I couldn't confidently analyze this image yet.\n\n"
-            "The photo appears to be unclear or shows only a partial view.\n\n"
-            "👉 Please upload a clear photo where your dog's face or body is visible."
-        )
-    elif repetition_count == 1:
-        return "I still need one clear photo of your dog to continue the analysis."
-    else:
-        return "Please upload a clear photo of your dog."
+    return _escalating_message("hairless_suspicion", recent_messages or [])
 
 
 def get_low_breed_confidence_message(breed_conf: float, recent_messages: list = None) -> str:
@@ -204,32 +255,9 @@ def get_low_breed_confidence_message(breed_conf: float, recent_messages: list =
     recent_messages = recent_messages or []
     
     if breed_conf < 0.30:
-        message_type = LOW_CONFIDENCE_WARNING
-        repetition_count = _count_recent_message_type(recent_messages, message_type)
-        
-        if repetition_count == 0:
-            return (
-                "⚠️ I couldn't confidently analyze this image yet.\n\n"
-                "The photo appears to be a close-up or partial view, so I wasn't able to clearly recognize your dog.\n\n"
-                "👉 Please upload a clear photo where your dog's face or body is visible."
-            )
-        elif repetition_count == 1:
-            return "I still need one clear photo of your dog to continue the analysis."
-        else:
-            return "Please upload a clear photo of your dog."
+        return _escalating_message("unclear_dog", recent_messages)
     else:
-        message_type = MEDIUM_CONFIDENCE_GUIDANCE
-        repetition_count = _count_recent_message_type(recent_messages, message_type)
-        
-        if repetition_count == 0:
-            return (
-                "🐾 I can see something that might be your dog, but I need a clearer image to be sure.\n\n"
-                "For best results:\n"
-                "• Upload one clear photo of your dog\n"
-                "• Then upload a close-up of the specific area you're concerned about"
-            )
-        else:
-            return "I need a clearer photo of your dog to continue."
+        return _escalating_message("possible_dog", recent_messages)
 
 
 def get_non_dog_message(recent_messages: list = None) -> str:
@@ -237,17 +265,4 @@ def get_non_dog_message(recent_messages: list = None) -> str:
     Message for non-dog images (goat, wolf, objects, etc.).
     Never mentions detected object name. Adaptive length.
     """
-    recent_messages = recent_messages or []
-    message_type = NON_DOG_MESSAGE
-    repetition_count = _count_recent_message_type(recent_messages, message_type)
-    
-    if repetition_count == 0:
-        return (
-            "I couldn't clearly recognize a dog in this image yet.\n\n"
-            "This tool works best with clear photos of dogs. Please upload a photo of your dog to continue."
-        )
-    elif repetition_count == 1:
-        return "I need a photo of your dog to continue. Please upload a clear photo of your dog."
-    else:
-        return "Please upload a photo of your dog."
-
+    return _escalating_message("non_dog", recent_messages or [])
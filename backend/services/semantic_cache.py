@@ -0,0 +1,93 @@
+# semantic_cache.py - Embedding-similarity cache for paraphrased chat questions
+"""
+Returns a previously generated answer when a new question is a close paraphrase
+(cosine similarity >= SEMANTIC_CACHE_THRESHOLD) of a cached one asked with the
+same context (pet profile, location, image analysis).
+
+Enabled with SEMANTIC_CACHE=1. The embedding model and FAISS index are only
+loaded on first use.
+"""
+
+import logging
+import os
+import threading
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_THRESHOLD = 0.92
+SEMANTIC_CACHE_MAX_ENTRIES = 10_000
+# Neighbours checked per lookup, since the closest match may belong to another context
+_SEARCH_K = 5
+
+_lock = threading.Lock()
+_model = None
+_index = None
+_entries = {}  # faiss id -> (context_key, answer)
+_order = deque()  # faiss ids, oldest first (FIFO eviction)
+_next_id = 0
+
+
+def _ensure_loaded():
+    global _model, _index
+    if _index is None:
+        import faiss
+        from sentence_transformers import SentenceTransformer
+
+        _model = SentenceTransformer("all-MiniLM-L6-v2")
+        dim = _model.get_sentence_embedding_dimension()
+        # Inner product on normalized vectors == cosine similarity
+        _index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+
+
+def _embed(question: str):
+    import numpy as np
+
+    vec = _model.encode(question, normalize_embeddings=True)
+    return np.asarray(vec, dtype="float32")[None, :]
+
+
+def lookup(question: str, context_key: bytes) -> Optional[str]:
+    """Return a cached answer for a paraphrase of `question` in the same context, if any."""
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    try:
+        with _lock:
+            _ensure_loaded()
+            if _index.ntotal == 0:
+                return None
+            scores, ids = _index.search(_embed(question), min(_SEARCH_K, _index.ntotal))
+            for score, idx in zip(scores[0], ids[0]):
+                if score < SEMANTIC_CACHE_THRESHOLD:
+                    break
+                entry = _entries.get(int(idx))
+                if entry and entry[0] == context_key:
+                    return entry[1]
+    except Exception as e:
+        logger.error("Semantic cache lookup error: %s", e)
+    return None
+
+
+def store(question: str, context_key: bytes, answer: str) -> None:
+    """Add an answer to the cache, evicting the oldest entry when full."""
+    global _next_id
+    if not SEMANTIC_CACHE_ENABLED:
+        return
+    import numpy as np
+
+    try:
+        with _lock:
+            _ensure_loaded()
+            if len(_order) >= SEMANTIC_CACHE_MAX_ENTRIES:
+                oldest = _order.popleft()
+                _index.remove_ids(np.array([oldest], dtype="int64"))
+                _entries.pop(oldest, None)
+            entry_id = _next_id
+            _next_id += 1
+            _index.add_with_ids(_embed(question), np.array([entry_id], dtype="int64"))
+            _entries[entry_id] = (context_key, answer)
+            _order.append(entry_id)
+    except Exception as e:
+        logger.error("Semantic cache store error: %s", e)
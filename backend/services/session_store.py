@@ -1,23 +1,45 @@
 # services/session_store.py
 import os
-import json
 import uuid
 import threading
-from datetime import datetime
+import time
+import atexit
 from typing import Dict, Any, List, Optional
-from .storage import UPLOAD_DIR
+import orjson
+from .storage import upload_path, utcnow_iso
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 SESSIONS_DIR = os.path.join(DATA_DIR, "sessions")
-#full_path = os.path.join(UPLOAD_DIR, filename)
+
+# Final snapshots keep the indented, non-ASCII-escaped layout json.dump(indent=2) gave
+_SNAPSHOT_OPTS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+# Event log lines: compact, one JSON object per line
+_LOG_OPTS = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+
+# Normalize role to match OpenAI API requirements
+_ROLE_MAP = {
+    "bot": "assistant",
+    "ai": "assistant",
+    "human": "user"
+}
 
 # Ensure folders exist
 os.makedirs(SESSIONS_DIR, exist_ok=True)
 
+# Rewrite an open session's event log as a single snapshot line after this many appends
+COMPACT_EVERY = 200
+# Events queued within this window are written to disk together
+FLUSH_INTERVAL = 0.2
+# Per-session work is guarded by one of this many striped locks (power of two)
+LOCK_STRIPES = 16
+
 class SessionStore:
     """
-    In-memory session store with optional on-disk JSON snapshots in data/sessions/{id}.json
+    In-memory session store. While a session is open every change is appended to an
+    event log in data/sessions/{id}.jsonl (replayed on startup); a background thread
+    writes queued events in batches every FLUSH_INTERVAL seconds. end_session writes
+    the final JSON snapshot to data/sessions/{id}.json and removes the log.
     Structure:
     {
       session_id: {
@@ -28,32 +50,131 @@ class SessionStore:
     }
     """
     def __init__(self):
+        # Short critical sections only: inserting/removing sessions and the event queue.
+        # Changes to one session's content hold that session's stripe lock instead, so
+        # different users' sessions don't wait on each other.
         self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
         self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._log_sizes: Dict[str, int] = {}
+        # Encoded events not yet on disk, per session
+        self._pending: Dict[str, List[bytes]] = {}
+        self._flush_cond = threading.Condition(self._lock)
+        # Serializes file writes, so a late flush can't recreate an ended session's log
+        self._io_lock = threading.Lock()
+        self._replay_logs()
+        threading.Thread(target=self._flush_loop, name="session-store-flush", daemon=True).start()
+        atexit.register(self.flush)
 
     # ---- basic helpers ----
     def _path(self, session_id: str) -> str:
         return os.path.join(SESSIONS_DIR, f"{session_id}.json")
 
-    def _save_snapshot(self, session_id: str) -> None:
-        path = self._path(session_id)
+    def _log_path(self, session_id: str) -> str:
+        return os.path.join(SESSIONS_DIR, f"{session_id}.jsonl")
+
+    def _lock_for(self, session_id: str) -> threading.Lock:
+        return self._stripes[hash(session_id) & (LOCK_STRIPES - 1)]
+
+    def _queue_event(self, session_id: str, event: Dict[str, Any]) -> None:
+        """
+        Queue one change for the session's log; the flusher thread writes it shortly after.
+        Call with the session's stripe lock held, together with the in-memory change, so a
+        compaction snapshot never misses or repeats an entry.
+        """
+        line = orjson.dumps(event, option=_LOG_OPTS)
         with self._lock:
-            data = self._sessions.get(session_id)
-            if data is None:
-                return
-            with open(path, "w", encoding="utf-8") as fp:
-                json.dump(data, fp, indent=2, ensure_ascii=False)
+            if not self._pending:
+                self._flush_cond.notify()
+            self._pending.setdefault(session_id, []).append(line)
+
+    def _flush_loop(self) -> None:
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._flush_cond.wait()
+            # Let the rest of the burst queue up, then write it in one go
+            time.sleep(FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all queued events now (one append per session, compacting long logs)"""
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            writes = []
+            for session_id, lines in pending.items():
+                data = self._sessions.get(session_id)
+                if data is None:
+                    continue  # ended meanwhile; its final snapshot has everything
+                count = self._log_sizes.get(session_id, 0) + len(lines)
+                if count < COMPACT_EVERY:
+                    writes.append((session_id, b"".join(lines), False))
+                    self._log_sizes[session_id] = count
+                    continue
+                # Compact: replace the log with one snapshot of the current state
+                with self._lock_for(session_id):
+                    snapshot = orjson.dumps({"op": "snapshot", "data": data}, option=_LOG_OPTS)
+                    # Events queued since the swap above are already in the snapshot
+                    with self._lock:
+                        self._pending.pop(session_id, None)
+                writes.append((session_id, snapshot, True))
+                self._log_sizes[session_id] = 1
+
+            for session_id, payload, compact in writes:
+                path = self._log_path(session_id)
+                if not compact:
+                    with open(path, "ab") as fp:
+                        fp.write(payload)
+                    continue
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as fp:
+                    fp.write(payload)
+                os.replace(tmp_path, path)
+
+    def _replay_logs(self) -> None:
+        """Rebuild open sessions from their event logs (e.g. after a restart)"""
+        for name in os.listdir(SESSIONS_DIR):
+            if not name.endswith(".jsonl"):
+                continue
+            session_id = name[:-len(".jsonl")]
+            data = None
+            count = 0
+            with open(os.path.join(SESSIONS_DIR, name), "rb") as fp:
+                for line in fp:
+                    try:
+                        event = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue  # partial line from an interrupted write
+                    count += 1
+                    op = event.get("op")
+                    if op == "create":
+                        data = {"created_at": event["created_at"], "chat_history": [], "image_history": []}
+                    elif op == "snapshot":
+                        data = event["data"]
+                    elif data is None:
+                        continue
+                    elif op == "chat":
+                        data["chat_history"].append(event["entry"])
+                    elif op == "image":
+                        data["image_history"].append(event["entry"])
+            if data is not None:
+                self._sessions[session_id] = data
+                self._log_sizes[session_id] = count
 
     # ---- API ----
     def create_session(self) -> str:
         session_id = str(uuid.uuid4())
-        with self._lock:
-            self._sessions[session_id] = {
-                "created_at": datetime.utcnow().isoformat() + "Z",
+        created_at = utcnow_iso()
+        with self._lock_for(session_id):
+            data = {
+                "created_at": created_at,
                 "chat_history": [],
                 "image_history": [],
             }
-        self._save_snapshot(session_id)
+            with self._lock:
+                self._sessions[session_id] = data
+            self._queue_event(session_id, {"op": "create", "created_at": created_at})
         return session_id
 
     def create_session_with_id(self, session_id: str) -> str:
@@ -61,14 +182,17 @@ class SessionStore:
         Create a session using a specific session_id.
         If session already exists, do nothing.
         """
-        with self._lock:
+        with self._lock_for(session_id):
             if session_id not in self._sessions:
-                self._sessions[session_id] = {
-                    "created_at": datetime.utcnow().isoformat() + "Z",
+                created_at = utcnow_iso()
+                data = {
+                    "created_at": created_at,
                     "chat_history": [],
                     "image_history": [],
                 }
-        self._save_snapshot(session_id)
+                with self._lock:
+                    self._sessions[session_id] = data
+                self._queue_event(session_id, {"op": "create", "created_at": created_at})
         return session_id
     
     
@@ -80,66 +204,71 @@ class SessionStore:
         """
         Adds a single user message and a single bot response (like analysis results)
         """
-        with self._lock:
-            if session_id not in self._sessions:
+        with self._lock_for(session_id):
+            data = self._sessions.get(session_id)
+            if data is None:
                 raise KeyError("Invalid session_id")
             
             # The structure is assumed to be {"role": ..., "text": ...}
             # We add both objects to the history array
-            self._sessions[session_id]["chat_history"].append(user_msg)
-            self._sessions[session_id]["chat_history"].append(bot_msg)
-
-        self._save_snapshot(session_id)
+            data["chat_history"].append(user_msg)
+            data["chat_history"].append(bot_msg)
+            self._queue_event(session_id, {"op": "chat", "entry": user_msg})
+            self._queue_event(session_id, {"op": "chat", "entry": bot_msg})
 
+    # Lookups don't lock: a single dict read is atomic in CPython
     def exists(self, session_id: str) -> bool:
-        with self._lock:
-            return session_id in self._sessions
+        return session_id in self._sessions
 
     def add_chat(self, session_id: str, role: str, text: str) -> None:
-        with self._lock:
-            if session_id not in self._sessions:
-                raise KeyError("Invalid session_id")
-            # Normalize role to match OpenAI API requirements
-        role_map = {
-            "bot": "assistant",
-            "ai": "assistant",
-            "human": "user"
-        }
-        normalized_role = role_map.get(role, role)  # fallback to same if already valid
-
-        self._sessions[session_id]["chat_history"].append({
-            "role": normalized_role,
+        entry = {
+            "role": _ROLE_MAP.get(role, role),  # fallback to same if already valid
             "text": text
-        })
-
-        self._save_snapshot(session_id)
+        }
+        with self._lock_for(session_id):
+            data = self._sessions.get(session_id)
+            if data is None:
+                raise KeyError("Invalid session_id")
+            data["chat_history"].append(entry)
+            self._queue_event(session_id, {"op": "chat", "entry": entry})
 
     def add_image_analysis(self, session_id: str, filename: str, analysis: Dict[str, Any]) -> None:
         
-        image_full_path = os.path.join(UPLOAD_DIR, filename) 
+        image_full_path = upload_path(filename) 
 
-        with self._lock:
-            if session_id not in self._sessions:
+        with self._lock_for(session_id):
+            data = self._sessions.get(session_id)
+            if data is None:
                 raise KeyError("Invalid session_id")
-            self._sessions[session_id]["image_history"].append({
+            entry = {
                 "filename": filename,
                 "image_path": image_full_path, # <--- CORRECTED
                 "analysis": analysis
-            })
-        self._save_snapshot(session_id)
+            }
+            data["image_history"].append(entry)
+            self._queue_event(session_id, {"op": "image", "entry": entry})
 
     def get_history(self, session_id: str) -> Dict[str, Any]:
-        with self._lock:
-            return self._sessions.get(session_id, {})
+        return self._sessions.get(session_id, {})
 
     def end_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Pop and return the final session content. Also keeps a final snapshot file."""
-        with self._lock:
-            data = self._sessions.pop(session_id, None)
+        with self._lock_for(session_id):
+            with self._lock:
+                data = self._sessions.pop(session_id, None)
+                # Queued events are covered by the final snapshot
+                self._pending.pop(session_id, None)
         if data is None:
             return None
         # Keep a final, immutable snapshot on disk for later viewing
         final_path = self._path(session_id)
-        with open(final_path, "w", encoding="utf-8") as fp:
-            json.dump(data, fp, indent=2, ensure_ascii=False)
+        with self._io_lock:
+            self._log_sizes.pop(session_id, None)
+            with open(final_path, "wb") as fp:
+                fp.write(orjson.dumps(data, option=_SNAPSHOT_OPTS))
+            # The snapshot now holds everything the event log did
+            try:
+                os.remove(self._log_path(session_id))
+            except FileNotFoundError:
+                pass
         return data
\ No newline at end of file
@@ -1,29 +1,100 @@
-import json 
 import os 
-from datetime import datetime 
-from typing import Any, Dict, List 
+import threading 
+import time 
+from typing import Any, Dict, List, Optional 
+import orjson 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__)) 
 DATA_DIR = os.path.join(BASE_DIR, "data") 
 UPLOAD_DIR = os.path.join(BASE_DIR, "uploaded_images") 
 REPORT_DIR = os.path.join(DATA_DIR, "reports") 
-HISTORY_FILE = os.path.join(DATA_DIR, "history.json") 
-IMAGES_FILE = os.path.join(DATA_DIR, "images.json") 
-REPORTS_FILE = os.path.join(DATA_DIR, "reports.json") 
+_UPLOAD_PREFIX = UPLOAD_DIR + os.sep 
+_SEPS = (os.sep, os.altsep) if os.altsep else (os.sep,) 
+# Append-only logs: one JSON object per line, so adding an entry never rewrites the file 
+HISTORY_FILE = os.path.join(DATA_DIR, "history.jsonl") 
+IMAGES_FILE = os.path.join(DATA_DIR, "images.jsonl") 
+REPORTS_FILE = os.path.join(DATA_DIR, "reports.jsonl") 
+_LEGACY_FILES = { 
+    HISTORY_FILE: os.path.join(DATA_DIR, "history.json"), 
+    IMAGES_FILE: os.path.join(DATA_DIR, "images.json"), 
+    REPORTS_FILE: os.path.join(DATA_DIR, "reports.json"), 
+} 
+_lock = threading.Lock() 
+_TAIL_CHUNK = 4096 
+# Entry counts (for the sequential ids) and lookup indexes, filled on first use 
+_counts: Dict[str, int] = {} 
+_images_by_id: Optional[Dict[str, Dict[str, Any]]] = None 
+_reports_by_filename: Optional[Dict[str, Dict[str, Any]]] = None 
 def ensure_dirs(): 
     os.makedirs(DATA_DIR, exist_ok=True) 
     os.makedirs(UPLOAD_DIR, exist_ok=True) 
     os.makedirs(REPORT_DIR, exist_ok=True) 
-    for f in [HISTORY_FILE, IMAGES_FILE, REPORTS_FILE]: 
+    for f, legacy in _LEGACY_FILES.items(): 
         if not os.path.exists(f): 
-            with open(f, "w", encoding="utf-8") as fp: 
-                json.dump([], fp) 
+            # Carry entries over from the old whole-list JSON files 
+            with open(f, "wb") as fp: 
+                for item in _load_json(legacy, []): 
+                    fp.write(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE)) 
+def upload_path(filename: str) -> str: 
+    """Full path of an uploaded image (same result as os.path.join(UPLOAD_DIR, filename))""" 
+    if any(sep in filename for sep in _SEPS): 
+        return os.path.join(UPLOAD_DIR, filename) 
+    return _UPLOAD_PREFIX + filename 
+# --- Timestamps --- 
+# (epoch second, "YYYY-MM-DDTHH:MM:SS") of the last timestamp; only the microseconds change within a second 
+_ts_cache = (None, "") 
+def utcnow_iso() -> str: 
+    """Current UTC time as ISO-8601 with microseconds and a "Z" suffix""" 
+    global _ts_cache 
+    sec, ns = divmod(time.time_ns(), 1_000_000_000) 
+    cached_sec, prefix = _ts_cache 
+    if sec != cached_sec: 
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec)) 
+        _ts_cache = (sec, prefix) 
+    return f"{prefix}.{ns // 1000:06d}Z" 
 # --- Base JSON helpers --- 
+def _parse_lines(lines) -> List[Dict[str, Any]]: 
+    items = [] 
+    for line in lines: 
+        try: 
+            items.append(orjson.loads(line)) 
+        except orjson.JSONDecodeError: 
+            continue  # blank or partially written line 
+    return items 
 def _load(path: str) -> List[Dict[str, Any]]: 
-    with open(path, "r", encoding="utf-8") as fp: 
-        return json.load(fp) 
-def _save(path: str, data: List[Dict[str, Any]]) -> None: 
-    with open(path, "w", encoding="utf-8") as fp: 
-        json.dump(data, fp, indent=2, ensure_ascii=False) 
+    if not os.path.exists(path): 
+        return [] 
+    with open(path, "rb") as fp: 
+        return _parse_lines(fp) 
+def _tail(path: str, n: int) -> List[Dict[str, Any]]: 
+    """Last n entries, read backwards from the end of the file in chunks""" 
+    if n <= 0 or not os.path.exists(path): 
+        return [] 
+    with open(path, "rb") as fp: 
+        pos = fp.seek(0, os.SEEK_END) 
+        chunks = [] 
+        newlines = 0 
+        # n + 1 newlines guarantee n whole lines after the (possibly cut) first one 
+        while pos > 0 and newlines <= n: 
+            step = min(_TAIL_CHUNK, pos) 
+            pos -= step 
+            fp.seek(pos) 
+            chunk = fp.read(step) 
+            newlines += chunk.count(b"\n") 
+            chunks.append(chunk) 
+    data = b"".join(reversed(chunks)) 
+    lines = data.split(b"\n") 
+    if pos > 0: 
+        lines = lines[1:] 
+    return _parse_lines([line for line in lines if line][-n:]) 
+def _append(path: str, item: Dict[str, Any]) -> None: 
+    with open(path, "ab") as fp: 
+        fp.write(orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE)) 
+def _next_number(path: str) -> int: 
+    """Sequential number for a new entry (call with _lock held)""" 
+    if path not in _counts: 
+        _counts[path] = len(_load(path)) 
+    _counts[path] += 1 
+    return _counts[path] 
 
 
 # --- Safer JSON helpers (with default) --- 
@@ -32,61 +103,70 @@ def _load_json(path: str, default):
     if not os.path.exists(path): 
         return default 
     try: 
-        with open(path, "r", encoding="utf-8") as fp: return json.load(fp) 
+        with open(path, "rb") as fp: return orjson.loads(fp.read()) 
     
     except Exception: 
         return default 
-def _save_json(path: str, data): 
-    with open(path, "w", encoding="utf-8") as fp: 
-        json.dump(data, fp, indent=2, ensure_ascii=False) 
         
 # --- Chat history --- 
 
 def add_chat(question: str, answer: str, matched: str, score: float) -> Dict[str, Any]: 
-    hist = _load(HISTORY_FILE) 
-    item = { 
-            "id": f"chat_{len(hist)+1}", "ts": datetime.utcnow().isoformat() + "Z", "question": question, "answer": answer, "matched_question": matched, "score": score } 
-    hist.append(item) 
-    _save(HISTORY_FILE, hist) 
+    with _lock: 
+        item = { 
+                "id": f"chat_{_next_number(HISTORY_FILE)}", "ts": utcnow_iso(), "question": question, "answer": answer, "matched_question": matched, "score": score } 
+        _append(HISTORY_FILE, item) 
     return item 
 
 def get_history(n: int = 50) -> List[Dict[str, Any]]: 
-    hist = _load(HISTORY_FILE) 
-    return hist[-n:] 
+    return _tail(HISTORY_FILE, n) 
 
 # --- Images --- 
 
 
+def _image_index() -> Dict[str, Dict[str, Any]]: 
+    global _images_by_id 
+    if _images_by_id is None: 
+        _images_by_id = {i["id"]: i for i in _load(IMAGES_FILE)} 
+    return _images_by_id 
+
 def register_image(filename: str, path: str) -> Dict[str, Any]: 
-    imgs = _load(IMAGES_FILE) 
-    item = { 
-            "id": f"img_{len(imgs)+1}", "filename": filename, "path": path, "ts": datetime.utcnow().isoformat() + "Z" } 
-    imgs.append(item) 
-    _save(IMAGES_FILE, imgs) 
+    with _lock: 
+        item = { 
+                "id": f"img_{_next_number(IMAGES_FILE)}", "filename": filename, "path": path, "ts": utcnow_iso() } 
+        _append(IMAGES_FILE, item) 
+        _image_index()[item["id"]] = item 
     return item 
 
 def get_image(image_id: str) -> Dict[str, Any]: 
-    imgs = _load(IMAGES_FILE) 
-    for i in imgs: 
-        if i["id"] == image_id: 
-            return i 
-    raise KeyError("image not found") 
+    with _lock: 
+        item = _image_index().get(image_id) 
+    if item is None: 
+        raise KeyError("image not found") 
+    return item 
 
 # --- Reports --- 
 
 
+def _report_index() -> Dict[str, Dict[str, Any]]: 
+    global _reports_by_filename 
+    if _reports_by_filename is None: 
+        _reports_by_filename = {} 
+        for r in _load(REPORTS_FILE): 
+            _reports_by_filename.setdefault(r["filename"], r) 
+    return _reports_by_filename 
+
 def register_report(filename: str) -> Dict[str, Any]: 
-    reports = _load_json(REPORTS_FILE, []) 
-    new_id = f"rep_{len(reports)+1}" 
-    # prevent duplicates 
-    for r in reports: 
-        if r["filename"] == filename: 
-            return r 
-    entry = { 
-             "id": new_id, "filename": filename, "path": os.path.join(REPORT_DIR, filename), "ts": datetime.utcnow().isoformat() + "Z", } 
-    reports.append(entry) 
-    _save_json(REPORTS_FILE, reports) 
+    with _lock: 
+        reports = _report_index() 
+        # prevent duplicates 
+        if filename in reports: 
+            return reports[filename] 
+        entry = { 
+                 "id": f"rep_{_next_number(REPORTS_FILE)}", "filename": filename, "path": os.path.join(REPORT_DIR, filename), "ts": utcnow_iso(), } 
+        _append(REPORTS_FILE, entry) 
+        reports[filename] = entry 
     return entry 
 
 def list_reports() -> List[Dict[str, Any]]: 
-    return _load_json(REPORTS_FILE, [])
\ No newline at end of file
+    with _lock: 
+        return list(_report_index().values()) 
\ No newline at end of file
@@ -37,7 +37,13 @@ echo ========================================
 echo.
 
 REM Start uvicorn server
-python -m uvicorn main:app --reload --host 0.0.0.0 --port 8000
+REM Auto-reload (a file watcher plus a restartable child process) only when DEV=1;
+REM uvicorn[standard] picks httptools (and uvloop where supported) automatically
+if "%DEV%"=="1" (
+    python -m uvicorn main:app --reload --host 0.0.0.0 --port 8000
+) else (
+    python -m uvicorn main:app --host 0.0.0.0 --port 8000
+)
 
 pause
 
@@ -41,5 +41,11 @@ Write-Host "========================================" -ForegroundColor Cyan
 Write-Host ""
 
 # Start uvicorn server using python -m to ensure correct environment
-python -m uvicorn main:app --reload --host 0.0.0.0 --port 8000
+# Auto-reload (a file watcher plus a restartable child process) only when DEV=1;
+# uvicorn[standard] picks httptools (and uvloop where supported) automatically
+if ($env:DEV -eq "1") {
+    python -m uvicorn main:app --reload --host 0.0.0.0 --port 8000
+} else {
+    python -m uvicorn main:app --host 0.0.0.0 --port 8000
+}
 
@@ -1,164 +1,507 @@
 # train_classifier.py
 
 # This script is designed to perform fine-tuning on the Stanford Dogs Dataset.
-# It is set to run on CPU only, which will take a very long time (days/weeks).
+# It uses a CUDA GPU when one is available; on CPU it will take a very long time (days/weeks).
+#
+# Image decoding/resizing in the DataLoader workers is often the bottleneck. Pillow-SIMD
+# (a drop-in Pillow build with SSE4/AVX2 resampling, linked against libjpeg-turbo) makes it
+# several times faster; torchvision picks it up without code changes:
+#   pip uninstall -y pillow && CC="cc -mavx2" pip install -U --force-reinstall pillow-simd
 
 import torch
-from torchvision import datasets, transforms
+from torchvision import datasets
+from torchvision.io import ImageReadMode, decode_image, decode_jpeg, encode_jpeg, read_file
+from torchvision.transforms import v2
 from efficientnet_pytorch import EfficientNet
 import torch.nn as nn
-from torch.utils.data import DataLoader, random_split
+from torch.utils.data import DataLoader, Subset
+from torch.utils.checkpoint import checkpoint
+import contextlib
+import copy
+import functools
 import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # --- 1. CONFIGURATION ---
 # Path to the Images folder you created in the 'data' directory:
 DATA_DIR = './data/Images' 
 SAVE_PATH = './services/dog_breed_weights.pth'
-# Batch size must be small for CPU memory
-BATCH_SIZE = 16 
+# Batch size must be small for CPU memory; on GPU, gradient checkpointing (USE_GRAD_CHECKPOINT)
+# leaves room for a larger one
+BATCH_SIZE = 64 if torch.cuda.is_available() else 16
+IMAGE_SIZE = 224  # EfficientNet-B0 input resolution
 NUM_EPOCHS = 40 # Running more epochs increases accuracy (>70% target)
 LEARNING_RATE = 0.001
-DEVICE = torch.device("cpu") # FORCED CPU TRAINING
+# Phase 1 trains only the classifier head, so run the frozen backbone once per image and
+# train the head on the cached features (no augmentation in that phase). Set to False to
+# train the head on augmented images instead (a full backbone pass per image per epoch).
+CACHE_PHASE1_FEATURES = True
+# Fixed seed for the train/val split, so resumed runs (weights reloaded from SAVE_PATH)
+# validate on the same held-out images they never trained on
+SPLIT_SEED = 0
+DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# Input shape is fixed (224x224), so let cuDNN benchmark and keep the fastest conv algorithms
+torch.backends.cudnn.benchmark = True
+# Mixed precision (FP16 autocast + loss scaling) on GPU; CPU stays in FP32
+USE_AMP = DEVICE.type == "cuda"
+# NHWC layout: cuDNN's fast (Tensor Core) conv kernels for FP16 expect channels-last tensors
+MEMORY_FORMAT = torch.channels_last if DEVICE.type == "cuda" else torch.contiguous_format
+# torch.compile (TorchInductor/Triton kernels) for the long fine-tuning phase; Triton has no
+# Windows build, so it is GPU-only and skipped there
+USE_COMPILE = DEVICE.type == "cuda" and os.name != "nt"
+# Decode/augment images in background worker processes so the GPU isn't left waiting. On CPU
+# the convolutions need the cores far more than the loader does, so only a couple of workers
+CPU_CORES = os.cpu_count() or 1
+NUM_WORKERS = min(8, CPU_CORES) if DEVICE.type == "cuda" else min(2, CPU_CORES // 2)
+# CPU training: intra-op (OpenMP/MKL) threads for the convolutions get the cores the workers
+# don't use (workers + threads <= cores), so the two don't oversubscribe the machine
+CPU_THREADS = max(1, CPU_CORES - NUM_WORKERS)
+# In Phase 2, recompute the activations of the blocks that backprop runs through instead of
+# storing them (roughly 30% more compute for a fraction of the activation memory)
+USE_GRAD_CHECKPOINT = DEVICE.type == "cuda"
+# Decode the JPEGs on the GPU (nvJPEG) and crop/flip them there; DataLoader workers then only
+# read the file bytes. Falls back to decoding in the workers when nvJPEG isn't available
+GPU_DECODE = DEVICE.type == "cuda"
 
 # --- 2. DATA PREPARATION ---
 # Training requires transformations and augmentation (crucial for high accuracy!)
+# Workers only crop/flip and hand back uint8 tensors (a quarter of the bytes of float32);
+# scaling and normalization happen batched on DEVICE in train_model (see normalize_batch)
 data_transforms = {
-    'train': transforms.Compose([
-        transforms.RandomResizedCrop(224),
-        transforms.RandomHorizontalFlip(),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+    'train': v2.Compose([
+        v2.RandomResizedCrop(IMAGE_SIZE, antialias=True),
+        v2.RandomHorizontalFlip(),
+        v2.PILToTensor(),
     ]),
-    'val': transforms.Compose([
-        transforms.Resize(256),
-        transforms.CenterCrop(224),
-        transforms.ToTensor(),
-        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+    'val': v2.Compose([
+        v2.Resize(256, antialias=True),
+        v2.CenterCrop(IMAGE_SIZE),
+        v2.PILToTensor(),
     ]),
 }
+# The same transforms minus PILToTensor, applied per image on DEVICE to GPU-decoded tensors
+gpu_transforms = {x: v2.Compose(data_transforms[x].transforms[:-1]) for x in ['train', 'val']}
+NORM_MEAN = [0.485, 0.456, 0.406]
+NORM_STD = [0.229, 0.224, 0.225]
+
+def normalize_batch(inputs, mean, std):
+    """uint8 [N,3,H,W] batch -> float, scaled to [0, 1] and normalized with ImageNet mean/std"""
+    return inputs.to(dtype=torch.float32, memory_format=MEMORY_FORMAT).div_(255.0).sub_(mean).div_(std)
+
+def collate_packed(batch):
+    """
+    Collate (uint8 image, label) samples into ONE flat uint8 buffer: the stacked images
+    followed by the labels as int64 bytes. The loader pins that single buffer and the
+    training loop copies it to DEVICE in one transfer (see unpack_batch).
+    """
+    n = len(batch)
+    image_shape = batch[0][0].shape
+    image_bytes = n * batch[0][0].numel()
+    buffer = torch.empty(image_bytes + n * 8, dtype=torch.uint8)
+    torch.stack([image for image, _ in batch], out=buffer[:image_bytes].view(n, *image_shape))
+    buffer[image_bytes:].view(torch.int64).copy_(torch.tensor([label for _, label in batch]))
+    return buffer, n
+
+def unpack_batch(buffer, n):
+    """Views of the images [N,3,H,W] (uint8) and labels [N] (int64) inside a packed buffer"""
+    image_bytes = buffer.numel() - n * 8
+    return buffer[:image_bytes].view(n, 3, IMAGE_SIZE, IMAGE_SIZE), buffer[image_bytes:].view(torch.int64)
+
+def collate_jpeg(batch):
+    """Collate (JPEG bytes, label) samples into the list of byte tensors and a label tensor"""
+    return [data for data, _ in batch], torch.tensor([label for _, label in batch])
+
+def device_batch(batch, augment):
+    """Images (uint8 [N,3,H,W]) and labels (int64 [N]) of a loader batch, on DEVICE"""
+    if not isinstance(batch[0], list):
+        buffer, n = batch  # collate_packed
+        return unpack_batch(buffer.to(DEVICE, non_blocking=True), n)
+
+    data, labels = batch  # collate_jpeg
+    try:
+        images = decode_jpeg(data, mode=ImageReadMode.RGB, device=DEVICE)
+    except RuntimeError:
+        # A file nvJPEG can't handle (e.g. CMYK, or not really a JPEG): decode this batch on the CPU
+        images = [decode_image(d, mode=ImageReadMode.RGB).to(DEVICE) for d in data]
+    transform = gpu_transforms['train' if augment else 'val']
+    return torch.stack([transform(image) for image in images]), labels.to(DEVICE, non_blocking=True)
+
+def nvjpeg_available():
+    """Whether torchvision can decode JPEGs on DEVICE (a CUDA build with nvJPEG)"""
+    if DEVICE.type != 'cuda':
+        return False
+    try:
+        decode_jpeg(encode_jpeg(torch.zeros(3, 8, 8, dtype=torch.uint8)), device=DEVICE)
+    except (RuntimeError, TypeError):
+        return False
+    return True
+
+class CachedImageFolder(datasets.ImageFolder):
+    """
+    ImageFolder that keeps its scanned (path, label) list in DATA_DIR/.samples.pkl, so
+    restarts skip walking and stat-ing every image. The cache is used while it is newer
+    than every class folder (adding/removing images there updates the folder's mtime)
+    and lists the same classes; otherwise the tree is scanned again and the cache rewritten.
+    """
+    SAMPLES_CACHE = '.samples.pkl'
+
+    def make_dataset(self, directory, class_to_idx, *args, **kwargs):
+        cache_path = os.path.join(directory, self.SAMPLES_CACHE)
+        try:
+            newest_folder = max(os.path.getmtime(os.path.join(directory, name)) for name in class_to_idx)
+            if os.path.getmtime(cache_path) > newest_folder:
+                with open(cache_path, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached['class_to_idx'] == class_to_idx:
+                    return cached['samples']
+        except (OSError, ValueError, EOFError, KeyError, pickle.UnpicklingError):
+            pass  # no usable cache; scan below
+
+        samples = super().make_dataset(directory, class_to_idx, *args, **kwargs)
+        try:
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'class_to_idx': class_to_idx, 'samples': samples}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # read-only dataset folder: just scan every time
+        return samples
+
+# Folder names like "n02085620-Chihuahua" / "Shih-Tzu" -> words separated by spaces
+_CLASS_NAME_SPACES = str.maketrans('_-', '  ')
+
+def check_pillow_build():
+    """Point out when the stock (non-SIMD) Pillow build is doing the image decoding"""
+    from PIL import Image
+    version = Image.__version__
+    if 'post' not in version and 'simd' not in version.lower():
+        print(f"NOTE: Using stock Pillow {version}; installing pillow-simd speeds up image loading (see top of file).")
+
+
+# Setup runs from the __main__ block below rather than at import time: DataLoader
+# worker processes re-import this module where they are spawned (Windows, macOS)
+def prepare_data():
+    # Load the entire dataset
+    print("Loading all images from dataset...")
+    try:
+        full_dataset = CachedImageFolder(DATA_DIR)
+        # Dynamically determine number of classes from dataset
+        num_classes = len(full_dataset.classes)
+        print(f"Found {num_classes} dog breed classes in dataset")
+    except FileNotFoundError as e:
+        print(f"ERROR: Cannot find dataset folder. Check DATA_DIR path: {DATA_DIR}")
+        print("Ensure you moved the 'Images' folder into the 'data' directory.")
+        exit()
+
+    # Split dataset into training (80%) and validation (20%)
+    train_size = int(0.8 * len(full_dataset))
+    indices = torch.randperm(len(full_dataset), generator=torch.Generator().manual_seed(SPLIT_SEED)).tolist()
+
+    # One view per split, each with its own transforms; copies share the scanned sample list,
+    # so the directory is walked only once (setting the transform on a shared dataset would
+    # switch the training split to the validation transforms too)
+    train_view = copy.copy(full_dataset)
+    train_view.transform = data_transforms['train']
+    val_view = copy.copy(full_dataset)
+    val_view.transform = data_transforms['val']
+    collate_fn, num_workers = collate_packed, NUM_WORKERS
+    if GPU_DECODE and nvjpeg_available():
+        # Workers just read the files, so a couple of them keep up; see device_batch
+        print("Decoding images on the GPU (nvJPEG).")
+        for view in (train_view, val_view):
+            view.loader = read_file
+            view.transform = None
+        collate_fn, num_workers = collate_jpeg, min(2, NUM_WORKERS)
+    train_dataset = Subset(train_view, indices[:train_size])
+    val_dataset = Subset(val_view, indices[train_size:])
+
+    image_datasets = {'train': train_dataset, 'val': val_dataset}
+
+    # Pinned host memory lets the non_blocking copies to the GPU run asynchronously
+    loader_options = {'num_workers': num_workers, 'pin_memory': DEVICE.type == 'cuda'}
+    if num_workers > 0:
+        loader_options.update(persistent_workers=True, prefetch_factor=4)
+    # The last partial training batch is dropped (a different random one each epoch) so every
+    # training step has the same shape: no extra cuDNN algorithm search or torch.compile
+    # recompile for it. Validation keeps every image
+    dataloaders = {x: DataLoader(image_datasets[x], batch_size=BATCH_SIZE, shuffle=True, collate_fn=collate_fn,
+                                 drop_last=x == 'train', **loader_options)
+                   for x in ['train', 'val']}
+    # Images actually seen per epoch (the loss/accuracy denominators)
+    dataset_sizes = {'train': len(dataloaders['train']) * BATCH_SIZE, 'val': len(val_dataset)}
+
+    # Deterministic (validation-transform, unshuffled) passes over both splits for the
+    # Phase 1 feature cache; workers exit after the single pass
+    feature_datasets = {'train': Subset(val_view, indices[:train_size]), 'val': val_dataset}
+    feature_loaders = {x: DataLoader(feature_datasets[x], batch_size=BATCH_SIZE, shuffle=False, collate_fn=collate_fn,
+                                     num_workers=num_workers, pin_memory=DEVICE.type == 'cuda')
+                       for x in ['train', 'val']}
+
+    # Save the class names (in the correct order) to the label file
+    # (ImageFolder's `classes` is already in label order: class_to_idx[classes[i]] == i)
+    class_names = [name.translate(_CLASS_NAME_SPACES) for name in full_dataset.classes]
+    with open('./assets/dog_breeds_120.txt', 'w') as f:
+        f.write('\n'.join(class_names))
+    print(f"Saved {len(class_names)} class names to dog_breeds_120.txt.")
+
+    return dataloaders, dataset_sizes, num_classes, feature_loaders
 
-# Load the entire dataset
-print("Loading all images from dataset...")
-try:
-    full_dataset = datasets.ImageFolder(DATA_DIR, data_transforms['train'])
-    # Dynamically determine number of classes from dataset
-    NUM_CLASSES = len(full_dataset.classes)
-    print(f"Found {NUM_CLASSES} dog breed classes in dataset")
-except FileNotFoundError as e:
-    print(f"ERROR: Cannot find dataset folder. Check DATA_DIR path: {DATA_DIR}")
-    print("Ensure you moved the 'Images' folder into the 'data' directory.")
-    exit()
 
-# Split dataset into training (80%) and validation (20%)
-train_size = int(0.8 * len(full_dataset))
-val_size = len(full_dataset) - train_size
-train_dataset, val_dataset = random_split(full_dataset, [train_size, val_size])
-
-# Apply validation transforms to the validation set split
-val_dataset.dataset.transform = data_transforms['val']
-
-image_datasets = {'train': train_dataset, 'val': val_dataset}
+# --- 3. MODEL SETUP (Fine-Tuning) ---
+def build_model(num_classes):
+    print(f"Setting up EfficientNet model on {DEVICE}...")
+    model = EfficientNet.from_pretrained('efficientnet-b0')
+
+    # Freeze the base layers (we only train the top layer initially)
+    for param in model.parameters():
+        param.requires_grad = False
+
+    # Replace the final classification layer for our 120 classes
+    num_ftrs = model._fc.in_features
+    model._fc = nn.Linear(num_ftrs, num_classes)
+
+    return model.to(DEVICE, memory_format=MEMORY_FORMAT)
+
+@contextlib.contextmanager
+def _bn_stats_frozen(module):
+    """BatchNorm momentum set to 0, so recomputing a block doesn't update its running stats twice"""
+    bn_layers = [m for m in module.modules() if isinstance(m, nn.modules.batchnorm._BatchNorm)]
+    momentums = [m.momentum for m in bn_layers]
+    for m in bn_layers:
+        m.momentum = 0.0
+    try:
+        yield
+    finally:
+        for m, momentum in zip(bn_layers, momentums):
+            m.momentum = momentum
+
+def checkpointed_extract_features(model, inputs):
+    """EfficientNet.extract_features, with every block from the first trainable one onward
+    checkpointed while training (the frozen blocks below it keep no activations anyway)"""
+    x = model._swish(model._bn0(model._conv_stem(inputs)))
+    training = model.training and torch.is_grad_enabled()
+    for idx, block in enumerate(model._blocks):
+        drop_connect_rate = model._global_params.drop_connect_rate
+        if drop_connect_rate:
+            drop_connect_rate *= float(idx) / len(model._blocks)
+        if training and (x.requires_grad or any(p.requires_grad for p in block.parameters())):
+            x = checkpoint(block, x, drop_connect_rate, use_reentrant=False,
+                           context_fn=lambda block=block: (contextlib.nullcontext(), _bn_stats_frozen(block)))
+        else:
+            x = block(x, drop_connect_rate=drop_connect_rate)
+    return model._swish(model._bn1(model._conv_head(x)))
 
-dataloaders = {x: DataLoader(image_datasets[x], batch_size=BATCH_SIZE, shuffle=True, num_workers=0)
-               for x in ['train', 'val']}
-dataset_sizes = {x: len(image_datasets[x]) for x in ['train', 'val']}
 
-# Save the class names (in the correct order) to the label file
-class_names = [item[0].replace('_', ' ').replace('-', ' ') for item in sorted(full_dataset.class_to_idx.items(), key=lambda item: item[1])]
-with open('./assets/dog_breeds_120.txt', 'w') as f:
-    f.write('\n'.join(class_names))
-print(f"Saved {len(class_names)} class names to dog_breeds_120.txt.")
+# --- 4. TRAINING FUNCTION ---
+def save_checkpoint(state, path):
+    """Write to a temp file, then swap it in, so an interrupted save never leaves a corrupt file"""
+    tmp_path = path + ".tmp"
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+def backbone_features(model, inputs):
+    """Pooled backbone features [N, 1280] (the classifier head's input), without autograd"""
+    with torch.no_grad():
+        return model._avg_pooling(model.extract_features(inputs)).flatten(start_dim=1)
+
+def head_only_forward(model, inputs):
+    """Forward pass with the frozen backbone run under no_grad; only the classifier head is tracked"""
+    return model._fc(model._dropout(backbone_features(model, inputs)))
+
+def compute_features(model, loader):
+    """One backbone pass over a split: float16 features and labels, both kept on DEVICE"""
+    model.eval()
+    mean = torch.tensor(NORM_MEAN, device=DEVICE).view(1, 3, 1, 1)
+    std = torch.tensor(NORM_STD, device=DEVICE).view(1, 3, 1, 1)
+    features, labels = [], []
+    for batch in loader:
+        inputs, batch_labels = device_batch(batch, augment=False)
+        with torch.autocast(device_type=DEVICE.type, dtype=torch.float16, enabled=USE_AMP):
+            features.append(backbone_features(model, normalize_batch(inputs, mean, std)).half())
+        labels.append(batch_labels)
+    return torch.cat(features), torch.cat(labels)
+
+def train_head(model, criterion, optimizer, num_epochs, feature_loaders):
+    """Phase 1 on cached features: the backbone runs once, then only _dropout + _fc train"""
+    print(f"\n--- Starting Training Phase: Classifier Head, cached features ({num_epochs} Epochs) ---")
+
+    # Reload best weights if available (the features must come from that backbone)
+    if os.path.exists(SAVE_PATH):
+        model.load_state_dict(torch.load(SAVE_PATH, map_location=DEVICE))
 
+    print("Computing backbone features once for both splits...")
+    features = {x: compute_features(model, feature_loaders[x]) for x in ['train', 'val']}
+    head = nn.Sequential(model._dropout, model._fc)  # the model's own head modules
 
-# --- 3. MODEL SETUP (Fine-Tuning) ---
-print("Setting up EfficientNet model...")
-model_ft = EfficientNet.from_pretrained('efficientnet-b0')
+    best_acc = 0.0
+    for epoch in range(num_epochs):
+        for phase in ['train', 'val']:
+            head.train(phase == 'train')
+            phase_features, phase_labels = features[phase]
+            size = len(phase_labels)
+            order = torch.randperm(size, device=DEVICE) if phase == 'train' else torch.arange(size, device=DEVICE)
+
+            running_loss = torch.zeros((), device=DEVICE)
+            running_corrects = torch.zeros((), dtype=torch.long, device=DEVICE)
+            for start in range(0, size, BATCH_SIZE):
+                idx = order[start:start + BATCH_SIZE]
+                inputs = phase_features[idx].float()
+                labels = phase_labels[idx]
+
+                optimizer.zero_grad(set_to_none=True)
+                # Validation runs in inference mode (no autograd bookkeeping at all)
+                with torch.inference_mode(phase == 'val'):
+                    outputs = head(inputs)
+                    loss = criterion(outputs, labels)
+                    if phase == 'train':
+                        loss.backward()
+                        optimizer.step()
 
-# Freeze the base layers (we only train the top layer initially)
-for param in model_ft.parameters():
-    param.requires_grad = False
+                running_loss += loss.detach() * inputs.size(0)
+                running_corrects += (outputs.argmax(dim=1) == labels).sum()
 
-# Replace the final classification layer for our 120 classes
-num_ftrs = model_ft._fc.in_features
-model_ft._fc = nn.Linear(num_ftrs, NUM_CLASSES)
+            epoch_loss = running_loss.item() / size
+            epoch_acc = running_corrects.item() / size
+            print(f'Epoch {epoch}: {phase} Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}')
 
-model_ft = model_ft.to(DEVICE)
-criterion = nn.CrossEntropyLoss()
-# Optimizer only trains the new final layer (since others are frozen)
-optimizer_ft = torch.optim.Adam(model_ft.parameters(), lr=LEARNING_RATE)
+            if phase == 'val' and epoch_acc > best_acc:
+                best_acc = epoch_acc
+                save_checkpoint({k: v.detach().to('cpu', copy=True) for k, v in model.state_dict().items()}, SAVE_PATH)
 
+    print(f'Best validation Acc achieved: {best_acc:.4f}')
+    return model
 
-# --- 4. TRAINING FUNCTION ---
-def train_model(model, criterion, optimizer, num_epochs, phase_name):
+def train_model(model, criterion, optimizer, num_epochs, phase_name, compile_model=False, head_only=False):
+    """head_only: the backbone is frozen; keep its BatchNorm statistics fixed and skip autograd for it"""
     print(f"\n--- Starting Training Phase: {phase_name} ({num_epochs} Epochs) ---")
+
+    # Batches run through the compiled wrapper; weights are saved/loaded on `model` itself so
+    # the checkpoint keys stay free of the wrapper's "_orig_mod." prefix
+    net = model
+    if compile_model and USE_COMPILE:
+        net = torch.compile(model, mode="max-autotune", fullgraph=False, dynamic=False)
+    if head_only:
+        net = functools.partial(head_only_forward, model)
     
     # Reload best weights if available before starting fine-tuning
     if os.path.exists(SAVE_PATH):
         model.load_state_dict(torch.load(SAVE_PATH, map_location=DEVICE))
     
     best_acc = 0.0
-    start_time = torch.zeros(1) # Placeholder for timer
+    start_time = time.perf_counter()  # wall clock for the whole phase
+    # GPU kernels run asynchronously, so epochs are timed on the GPU's own stream with events
+    if DEVICE.type == 'cuda':
+        epoch_start = torch.cuda.Event(enable_timing=True)
+        epoch_end = torch.cuda.Event(enable_timing=True)
+    # Checkpoints are written by a background thread while training continues
+    saver = ThreadPoolExecutor(max_workers=1)
+    pending_save = None
+    # Allocated once per phase and broadcast over every batch
+    mean = torch.tensor(NORM_MEAN, device=DEVICE).view(1, 3, 1, 1)
+    std = torch.tensor(NORM_STD, device=DEVICE).view(1, 3, 1, 1)
+    # Scales the loss so small FP16 gradients don't underflow (a no-op when AMP is off)
+    scaler = torch.cuda.amp.GradScaler(enabled=USE_AMP)
 
     for epoch in range(num_epochs):
+        if DEVICE.type == 'cuda':
+            epoch_start.record()
         # We check the validation set after every training epoch
         for phase in ['train', 'val']:
-            if phase == 'train':
+            if phase == 'train' and head_only:
+                # Frozen backbone in inference mode (BN uses its running stats); head dropout stays on
+                model.eval()
+                model._dropout.train()
+            elif phase == 'train':
                 model.train()  # Set model to training mode
             else:
                 model.eval()   # Set model to evaluate mode
 
-            running_loss = 0.0
-            running_corrects = 0
+            # Accumulated on DEVICE; read back once per phase instead of syncing every batch
+            running_loss = torch.zeros((), device=DEVICE)
+            running_corrects = torch.zeros((), dtype=torch.long, device=DEVICE)
 
-            # Start timer for CPU warning
-            if phase == 'train' and epoch == 0:
-                start_time = torch.tensor(os.times().system + os.times().user)
+            if phase == 'train' and epoch == 0 and DEVICE.type == 'cpu':
                 print(f"WARNING: CPU training is extremely slow. Est. time per epoch: {len(dataloaders[phase]) * 0.5:.0f} mins or more.")
 
 
             # Iterate over data.
-            for inputs, labels in dataloaders[phase]:
-                inputs = inputs.to(DEVICE)
-                labels = labels.to(DEVICE)
+            for batch in dataloaders[phase]:
+                # One host-to-device copy for images and labels together (or GPU decoding)
+                inputs, labels = device_batch(batch, augment=phase == 'train')
+                inputs = normalize_batch(inputs, mean, std)
 
-                optimizer.zero_grad()
+                optimizer.zero_grad(set_to_none=True)
 
                 # forward
-                with torch.set_grad_enabled(phase == 'train'):
-                    outputs = model(inputs)
-                    _, preds = torch.max(outputs, 1)
-                    loss = criterion(outputs, labels)
+                # Validation runs in inference mode (no autograd bookkeeping at all)
+                with torch.inference_mode(phase == 'val'):
+                    with torch.autocast(device_type=DEVICE.type, dtype=torch.float16, enabled=USE_AMP):
+                        outputs = net(inputs)
+                        loss = criterion(outputs, labels)
+                    preds = outputs.argmax(dim=1)
 
                     # backward + optimize only if in training phase
                     if phase == 'train':
-                        loss.backward()
-                        optimizer.step()
+                        scaler.scale(loss).backward()
+                        scaler.step(optimizer)
+                        scaler.update()
 
-                running_loss += loss.item() * inputs.size(0)
-                running_corrects += torch.sum(preds == labels.data)
+                running_loss += loss.detach().float() * inputs.size(0)
+                running_corrects += (preds == labels).sum()
 
-            epoch_loss = running_loss / dataset_sizes[phase]
-            epoch_acc = running_corrects.double() / dataset_sizes[phase]
+            epoch_loss = running_loss.item() / dataset_sizes[phase]
+            epoch_acc = running_corrects.item() / dataset_sizes[phase]
 
             print(f'Epoch {epoch}: {phase} Loss: {epoch_loss:.4f} Acc: {epoch_acc:.4f}')
 
             # Save the best model based on validation accuracy
             if phase == 'val' and epoch_acc > best_acc:
                 best_acc = epoch_acc
-                torch.save(model.state_dict(), SAVE_PATH) # Save the best weights!
-
-    # Final CPU Time Check (Approximation)
-    end_time = torch.tensor(os.times().system + os.times().user)
-    print(f'Total CPU time for training: {(end_time - start_time) / 60:.2f} minutes.')
+                # Snapshot to CPU now (copies, so later updates don't leak in); pickle + disk later
+                state = {k: v.detach().to('cpu', copy=True) for k, v in model.state_dict().items()}
+                if pending_save is not None:
+                    pending_save.result()  # surface errors from the previous save
+                pending_save = saver.submit(save_checkpoint, state, SAVE_PATH) # Save the best weights!
+
+        if DEVICE.type == 'cuda':
+            epoch_end.record()
+            epoch_end.synchronize()
+            print(f'Epoch {epoch}: GPU time {epoch_start.elapsed_time(epoch_end) / 1000:.1f}s')
+
+    # The next phase reloads SAVE_PATH, so the last save must be on disk before returning
+    saver.shutdown(wait=True)
+    if pending_save is not None:
+        pending_save.result()
+
+    print(f'Total training time: {(time.perf_counter() - start_time) / 60:.2f} minutes.')
     print(f'Best validation Acc achieved: {best_acc:.4f}')
     return model
 
 
 # --- 5. EXECUTION ---
 if __name__ == '__main__':
+    if DEVICE.type == 'cpu':
+        # Set here rather than at import: spawned DataLoader workers re-import this module
+        torch.set_num_threads(CPU_THREADS)
+        torch.set_num_interop_threads(2)
+    check_pillow_build()
+    dataloaders, dataset_sizes, NUM_CLASSES, feature_loaders = prepare_data()
+    model_ft = build_model(NUM_CLASSES)
+    # Label smoothing keeps the 120-way head from getting overconfident on similar-looking breeds
+    criterion = nn.CrossEntropyLoss(label_smoothing=0.1)
+    # Optimizer only trains the new final layer (since others are frozen). On GPU the fused
+    # implementation updates all parameters in one kernel instead of several per tensor
+    optimizer_ft = torch.optim.Adam(filter(lambda p: p.requires_grad, model_ft.parameters()), lr=LEARNING_RATE,
+                                    fused=DEVICE.type == "cuda")
+
     # Phase 1: Train ONLY the final classification layer (Fastest step)
     print("PHASE 1: Training only the final classifier layer.")
-    model_ft = train_model(model_ft, criterion, optimizer_ft, num_epochs=3, phase_name="Classifier Head")
+    if CACHE_PHASE1_FEATURES:
+        model_ft = train_head(model_ft, criterion, optimizer_ft, num_epochs=3, feature_loaders=feature_loaders)
+    else:
+        model_ft = train_model(model_ft, criterion, optimizer_ft, num_epochs=3, phase_name="Classifier Head", head_only=True)
     
     # PHASE 2: Unfreeze and Retrain (The long step for high accuracy)
     print("\nPHASE 2: Unfreezing top blocks for full fine-tuning (CRITICAL for >70% accuracy).")
@@ -168,8 +511,14 @@ if __name__ == '__main__':
         if '_blocks.6' in name or '_blocks.5' in name or '_fc' in name:
             param.requires_grad = True
 
+    # EfficientNet's forward is monolithic, so swap in the checkpointed feature extractor
+    if USE_GRAD_CHECKPOINT:
+        model_ft.extract_features = functools.partial(checkpointed_extract_features, model_ft)
+
     # Use a much lower learning rate for the full fine-tuning
-    optimizer_ft = torch.optim.Adam(filter(lambda p: p.requires_grad, model_ft.parameters()), lr=1e-5)
+    optimizer_ft = torch.optim.Adam(filter(lambda p: p.requires_grad, model_ft.parameters()), lr=1e-5,
+                                    fused=DEVICE.type == "cuda")
 
-    # Run the main training phase (this is the step that takes days on CPU)
-    train_model(model_ft, criterion, optimizer_ft, num_epochs=NUM_EPOCHS, phase_name="Full Fine-Tuning")
\ No newline at end of file
+    # Run the main training phase (this is the step that takes days on CPU). Compiled only
+    # now, after the requires_grad changes above, which would otherwise force a recompile
+    train_model(model_ft, criterion, optimizer_ft, num_epochs=NUM_EPOCHS, phase_name="Full Fine-Tuning", compile_model=True)
\ No newline at end of file